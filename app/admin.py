@@ -1,24 +1,24 @@
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime
+import contextlib
+import csv
+import io
 import os
+import tempfile
 
-from fastapi import APIRouter, Depends, Request, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.responses import StreamingResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from .database import get_db
-from . import models
+from .database import SessionLocal, get_db
+from . import models, catalog, entitlements, media_jobs, stats
+from .pagination import clamp_limit, keyset_page, page_url
 from .auth import require_auth, is_authenticated
 from .config import settings
-
-try:
-    from mutagen.mp3 import MP3
-except Exception:  # pragma: no cover
-    MP3 = None  # type: ignore
-
-templates = Jinja2Templates(directory="templates")
+from .templating import templates
 
 router = APIRouter(prefix="/admin")
 
@@ -27,6 +27,19 @@ def _guard(request: Request) -> Optional[RedirectResponse]:
     return require_auth(request)
 
 
+def _transaction_rows(db: Session):
+    """
+    Транзакции для списков: пользователь и подкаст приходят тем же запросом (JOIN),
+    только колонки, которые выводят шаблоны. Прочие связи — raiseload, чтобы N+1 не вернулся молча.
+    """
+    txn = models.Transaction
+    return db.query(txn).options(
+        joinedload(txn.user).load_only(models.User.telegram_id),
+        joinedload(txn.podcast).load_only(models.Podcast.title),
+        raiseload("*"),
+    )
+
+
 def _has_file(upload: UploadFile | None) -> bool:
     try:
         return bool(upload and getattr(upload, "filename", None))
@@ -38,42 +51,32 @@ def _has_file(upload: UploadFile | None) -> bool:
 def dashboard(request: Request, db: Session = Depends(get_db)):
     if redirect := _guard(request):
         return redirect
-    total_podcasts = db.query(models.Podcast).count()
-    total_published = db.query(models.Podcast).filter(models.Podcast.is_published.is_(True)).count()
-    total_drafts = max(0, total_podcasts - total_published)
-    total_users = db.query(models.User).count()
-    total_subscriptions = db.query(models.User).filter(models.User.has_subscription.is_(True)).count()
-    total_transactions = db.query(models.Transaction).count()
-    total_success_tx = db.query(models.Transaction).filter(models.Transaction.status == "success").count()
+    # counters are maintained by the write paths, see app/stats.py
+    counters = stats.read(db)
 
     latest_podcasts = (
         db.query(models.Podcast)
+        .options(load_only(models.Podcast.title, models.Podcast.published_at, models.Podcast.is_published))
         .order_by(models.Podcast.published_at.desc())
         .limit(5)
         .all()
     )
     latest_transactions = (
-        db.query(models.Transaction)
+        _transaction_rows(db)
         .order_by(models.Transaction.created_at.desc())
         .limit(5)
         .all()
     )
-    # subscription price from config
-    cfg = db.query(models.AppConfig).first()
-    sub_price_cents = cfg.subscription_price_cents if cfg else 0
+    # subscription price from the cached price book
+    sub_price_cents = catalog.price_book(db).subscription_cents
 
     return templates.TemplateResponse(
         "admin/dashboard.html",
         {
             "request": request,
             "stats": {
-                "podcasts": total_podcasts,
-                "published": total_published,
-                "drafts": total_drafts,
-                "users": total_users,
-                "subscriptions": total_subscriptions,
-                "transactions": total_transactions,
-                "success_tx": total_success_tx,
+                **counters,
+                "drafts": max(0, counters["podcasts"] - counters["published"]),
             },
             "latest_podcasts": latest_podcasts,
             "latest_transactions": latest_transactions,
@@ -97,6 +100,7 @@ def update_pricing(request: Request, subscription_price_rub: int = Form(0), db:
     except Exception:
         cfg.subscription_price_cents = 0
     db.commit()
+    catalog.bump()
     return RedirectResponse("/admin", status_code=302)
 
 
@@ -130,6 +134,7 @@ def project_create(
     item = models.ProjectCard(title=title, url=url, order=order, is_internal=is_internal)
     db.add(item)
     db.commit()
+    catalog.bump()
     return RedirectResponse(url="/admin/projects", status_code=302)
 
 
@@ -163,6 +168,7 @@ def project_edit(
     item.order = order
     item.is_internal = is_internal
     db.commit()
+    catalog.bump()
     return RedirectResponse(url="/admin/projects", status_code=302)
 
 
@@ -174,18 +180,43 @@ def project_delete(project_id: int, request: Request, db: Session = Depends(get_
     if item:
         db.delete(item)
         db.commit()
+        catalog.bump()
     return RedirectResponse(url="/admin/projects", status_code=302)
 
 
 # Podcasts CRUD
 @router.get("/podcasts", response_class=HTMLResponse)
-def podcasts_list(request: Request, db: Session = Depends(get_db)):
+def podcasts_list(
+    request: Request,
+    category: str = "",
+    published: str = "",
+    after: str | None = None,
+    limit: int | None = None,
+    db: Session = Depends(get_db),
+):
     if redirect := _guard(request):
         return redirect
-    items = db.query(models.Podcast).order_by(models.Podcast.published_at.desc()).all()
-    # map id->price
-    prices = {pp.podcast_id: pp.price_cents for pp in db.query(models.PodcastPrice).all()}
-    return templates.TemplateResponse("admin/podcasts_list.html", {"request": request, "items": items, "prices": prices})
+    limit = clamp_limit(limit)
+    q = db.query(models.Podcast).options(joinedload(models.Podcast.price))
+    if category:
+        q = q.filter(models.Podcast.category == category)
+    if published in {"0", "1"}:
+        q = q.filter(models.Podcast.is_published.is_(published == "1"))
+    items, next_cursor = keyset_page(q, models.Podcast.published_at, models.Podcast.id, after, limit)
+    # id->price for the page, loaded by the same query
+    prices = {it.id: it.price.price_cents for it in items if it.price}
+    filters = {"category": category, "published": published}
+    return templates.TemplateResponse(
+        "admin/podcasts_list.html",
+        {
+            "request": request,
+            "items": items,
+            "prices": prices,
+            "filters": filters,
+            "first_url": page_url("/admin/podcasts", filters, limit=limit) if after else None,
+            "next_url": page_url("/admin/podcasts", filters, next_cursor, limit) if next_cursor else None,
+        },
+    )
 
 
 @router.get("/podcasts/create", response_class=HTMLResponse)
@@ -213,9 +244,14 @@ def podcast_create(
     if redirect := _guard(request):
         return redirect
 
-    cover_path = _save_upload(cover) if _has_file(cover) else None
-    full_path = _save_upload(full) if _has_file(full) else None
-    duration = _get_duration_seconds(full_path) if full_path else 0
+    try:
+        cover_path, full_path = _save_uploads(cover, full)
+    except UploadTooLarge as e:
+        return templates.TemplateResponse(
+            "admin/podcast_form.html",
+            {"request": request, "item": None, "prices": {}, "error": str(e)},
+            status_code=413,
+        )
 
     pub_dt = datetime.fromisoformat(published_at) if published_at else datetime.utcnow()
 
@@ -224,13 +260,14 @@ def podcast_create(
         description=description,
         category=category,
         published_at=pub_dt,
-        duration_seconds=duration,
+        duration_seconds=0,  # filled in by the media job
         cover_path=cover_path,
         audio_full_path=full_path,
         is_published=is_published,
         is_free=is_free,
     )
     db.add(item)
+    stats.bump(db, podcasts=1, published=1 if is_published else 0)
     db.commit()
     # set price if provided
     try:
@@ -239,7 +276,12 @@ def podcast_create(
         price_cents = 0
     pp = models.PodcastPrice(podcast_id=item.id, price_cents=price_cents)
     db.add(pp)
+    if cover_path:
+        media_jobs.enqueue(db, item.id, cover_path, kind="cover")
+    if full_path:
+        media_jobs.enqueue(db, item.id, full_path)
     db.commit()
+    catalog.bump()
     return RedirectResponse("/admin/podcasts", status_code=302)
 
 
@@ -247,11 +289,14 @@ def podcast_create(
 def podcast_edit_form(podcast_id: int, request: Request, db: Session = Depends(get_db)):
     if redirect := _guard(request):
         return redirect
-    item = db.get(models.Podcast, podcast_id)
+    item = db.get(models.Podcast, podcast_id, options=[joinedload(models.Podcast.price)])
     if not item:
         return RedirectResponse("/admin/podcasts", status_code=302)
-    prices = {pp.podcast_id: pp.price_cents for pp in db.query(models.PodcastPrice).filter(models.PodcastPrice.podcast_id == item.id)}
-    return templates.TemplateResponse("admin/podcast_form.html", {"request": request, "item": item, "prices": prices})
+    prices = {item.id: item.price.price_cents} if item.price else {}
+    return templates.TemplateResponse(
+        "admin/podcast_form.html",
+        {"request": request, "item": item, "prices": prices, "job": media_jobs.latest_job(db, item.id)},
+    )
 
 
 @router.post("/podcasts/{podcast_id}/edit")
@@ -274,18 +319,32 @@ def podcast_edit(
     item = db.get(models.Podcast, podcast_id)
     if not item:
         return RedirectResponse("/admin/podcasts", status_code=302)
+    try:
+        cover_path, full_path = _save_uploads(cover, full)
+    except UploadTooLarge as e:
+        prices = {pp.podcast_id: pp.price_cents for pp in db.query(models.PodcastPrice).filter(models.PodcastPrice.podcast_id == item.id)}
+        return templates.TemplateResponse(
+            "admin/podcast_form.html",
+            {"request": request, "item": item, "prices": prices, "error": str(e)},
+            status_code=413,
+        )
 
     item.title = title
     item.description = description
     item.category = category
     item.published_at = datetime.fromisoformat(published_at) if published_at else item.published_at
+    if bool(item.is_published) != bool(is_published):
+        stats.bump(db, published=1 if is_published else -1)
     item.is_published = is_published
     item.is_free = is_free
-    if _has_file(cover):
-        item.cover_path = _save_upload(cover)
-    if _has_file(full):
-        item.audio_full_path = _save_upload(full)
-        item.duration_seconds = _get_duration_seconds(item.audio_full_path)
+    if cover_path:
+        item.cover_path = cover_path
+        media_jobs.enqueue(db, item.id, cover_path, kind="cover")
+    if full_path:
+        item.audio_full_path = full_path
+        item.duration_seconds = 0
+        item.audio_preview_path = None
+        media_jobs.enqueue(db, item.id, full_path)
 
     db.commit()
     # update price
@@ -299,6 +358,7 @@ def podcast_edit(
     else:
         db.add(models.PodcastPrice(podcast_id=item.id, price_cents=price_cents))
     db.commit()
+    catalog.bump()
     return RedirectResponse("/admin/podcasts", status_code=302)
 
 
@@ -308,25 +368,75 @@ def podcast_delete(podcast_id: int, request: Request, db: Session = Depends(get_
         return redirect
     item = db.get(models.Podcast, podcast_id)
     if item:
+        db.query(models.MediaJob).filter(models.MediaJob.podcast_id == item.id).delete(synchronize_session=False)
+        variants = db.query(models.CoverVariant).filter(models.CoverVariant.podcast_id == item.id)
+        for variant in variants:
+            _remove_upload(variant.path)
+        variants.delete(synchronize_session=False)
+        stats.bump(db, podcasts=-1, published=-1 if item.is_published else 0)
         db.delete(item)
         db.commit()
+        catalog.bump()
     return RedirectResponse("/admin/podcasts", status_code=302)
 
 
 @router.get("/transactions", response_class=HTMLResponse)
-def transactions(request: Request, db: Session = Depends(get_db)):
+def transactions(
+    request: Request,
+    status: str = "",
+    txn_type: str = Query("", alias="type"),
+    after: str | None = None,
+    limit: int | None = None,
+    db: Session = Depends(get_db),
+):
     if redirect := _guard(request):
         return redirect
-    items = db.query(models.Transaction).order_by(models.Transaction.created_at.desc()).all()
-    return templates.TemplateResponse("admin/transactions_list.html", {"request": request, "items": items})
+    limit = clamp_limit(limit)
+    q = _transaction_rows(db)
+    if status:
+        q = q.filter(models.Transaction.status == status)
+    if txn_type:
+        q = q.filter(models.Transaction.type == txn_type)
+    items, next_cursor = keyset_page(q, models.Transaction.created_at, models.Transaction.id, after, limit)
+    filters = {"status": status, "type": txn_type}
+    return templates.TemplateResponse(
+        "admin/transactions_list.html",
+        {
+            "request": request,
+            "items": items,
+            "filters": filters,
+            "first_url": page_url("/admin/transactions", filters, limit=limit) if after else None,
+            "next_url": page_url("/admin/transactions", filters, next_cursor, limit) if next_cursor else None,
+        },
+    )
 
 
 @router.get("/users", response_class=HTMLResponse)
-def users(request: Request, db: Session = Depends(get_db)):
+def users(
+    request: Request,
+    subscription: str = "",
+    after: str | None = None,
+    limit: int | None = None,
+    db: Session = Depends(get_db),
+):
     if redirect := _guard(request):
         return redirect
-    items = db.query(models.User).order_by(models.User.created_at.desc()).all()
-    return templates.TemplateResponse("admin/users.html", {"request": request, "items": items})
+    limit = clamp_limit(limit)
+    q = db.query(models.User)
+    if subscription in {"0", "1"}:
+        q = q.filter(models.User.has_subscription.is_(subscription == "1"))
+    items, next_cursor = keyset_page(q, models.User.created_at, models.User.id, after, limit)
+    filters = {"subscription": subscription}
+    return templates.TemplateResponse(
+        "admin/users.html",
+        {
+            "request": request,
+            "items": items,
+            "filters": filters,
+            "first_url": page_url("/admin/users", filters, limit=limit) if after else None,
+            "next_url": page_url("/admin/users", filters, next_cursor, limit) if next_cursor else None,
+        },
+    )
 
 
 @router.get("/users/{user_id}/edit", response_class=HTMLResponse)
@@ -352,86 +462,234 @@ def user_edit(
     user = db.get(models.User, user_id)
     if not user:
         return RedirectResponse("/admin/users", status_code=302)
+    old_telegram_id = user.telegram_id
+    if bool(user.has_subscription) != bool(has_subscription):
+        stats.bump(db, subscriptions=1 if has_subscription else -1)
     user.telegram_id = telegram_id
     user.has_subscription = has_subscription
+    if has_subscription:
+        entitlements.grant(db, user.id, None)
+    else:
+        entitlements.revoke(db, user.id, None)
     db.commit()
+    entitlements.invalidate(old_telegram_id, telegram_id)
     return RedirectResponse("/admin/users", status_code=302)
 
 
-def _save_upload(file: UploadFile | None) -> Optional[str]:
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+# Правило одно: каждый файл формы не больше MAX_UPLOAD_MB (_save_upload). Middleware до разбора
+# отсекает только то, что заведомо его нарушает: тело больше, чем все файловые поля формы
+# подкаста по MAX_UPLOAD_MB плюс запас на текстовые поля и заголовки частей multipart.
+UPLOAD_FILE_FIELDS = ("cover", "full")
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+def upload_request_limit() -> int:
+    """Наибольшее тело multipart-запроса, в котором каждый файл может уложиться в MAX_UPLOAD_MB; 0 — без лимита."""
+    max_bytes = settings.max_upload_mb * 1024 * 1024
+    return len(UPLOAD_FILE_FIELDS) * max_bytes + UPLOAD_FORM_OVERHEAD if max_bytes else 0
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    upload_request_limit() на multipart-запросы админки до разбора формы: по Content-Length
+    отказываем сразу, не читая тело; без него (chunked) считаем байты в receive и
+    прерываем чтение, как только лимит превышен. Иначе Starlette успевает сложить
+    всю загрузку во временный файл, и только потом _save_upload её отвергает.
+    """
+
+    def __init__(self, app: ASGIApp, prefix: str = "/admin/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = upload_request_limit()
+        if scope["type"] != "http" or not limit or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").lower().startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Загрузка больше {limit // (1024 * 1024)} МБ: каждый файл — не больше {settings.max_upload_mb} МБ"
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI пробрасывает HTTPException из разбора тела как есть
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited, send)
+
+
+def _save_upload(
+    file: UploadFile | None,
+    max_bytes: int | None = None,
+    on_progress: Callable[[int, int | None], None] | None = None,
+) -> Optional[str]:
+    """
+    Сохранить загрузку в uploads/ кусками по UPLOAD_CHUNK_SIZE: пишем во временный файл
+    рядом и атомарно переименовываем, так что по /uploads никогда не виден недописанный файл.
+    Источник — уже заспуленный Starlette временный файл, то есть загрузка пишется на диск
+    дважды (см. README, Uploads); память при этом ограничена куском.
+    max_bytes — лимит размера одного файла (по умолчанию MAX_UPLOAD_MB).
+    on_progress(written, total) вызывается после каждого куска: written — записано байт,
+    total — размер файла, если он известен (UploadFile.size), иначе None. Исключение из
+    хука прерывает загрузку, временный файл удаляется.
+    """
     if not file:
         return None
-    safe_name = f"{datetime.utcnow().timestamp()}_{file.filename.replace(' ', '_')}"
+    if max_bytes is None:
+        max_bytes = settings.max_upload_mb * 1024 * 1024
+    safe_name = f"{datetime.utcnow().timestamp()}_{os.path.basename(file.filename).replace(' ', '_')}"
     dest_path = os.path.join(settings.uploads_dir, safe_name)
-    with open(dest_path, "wb") as f:
-        f.write(file.file.read())
+    fd, tmp_path = tempfile.mkstemp(dir=settings.uploads_dir, prefix=".upload-", suffix=".part")
+    written, total = 0, file.size
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise UploadTooLarge(f"Файл {file.filename} больше {max_bytes // (1024 * 1024)} МБ")
+                out.write(chunk)
+                if on_progress:
+                    on_progress(written, total)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
     return f"/{settings.uploads_dir}/{safe_name}"
 
 
-def _get_duration_seconds(path: Optional[str]) -> int:
-    if not path or not MP3:
-        return 0
-    full_path = path.lstrip("/")
+def _remove_upload(web_path: Optional[str]) -> None:
+    if web_path:
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(settings.uploads_dir, os.path.basename(web_path)))
+
+
+def _save_uploads(cover: UploadFile | None, full: UploadFile | None) -> tuple[Optional[str], Optional[str]]:
+    """Обложка и полный выпуск формы подкаста; при ошибке уже сохранённое удаляется."""
+    cover_path = _save_upload(cover) if _has_file(cover) else None
     try:
-        audio = MP3(full_path)
-        return int(audio.info.length)
-    except Exception:
-        return 0
+        full_path = _save_upload(full) if _has_file(full) else None
+    except BaseException:
+        _remove_upload(cover_path)
+        raise
+    return cover_path, full_path
+
+
+EXPORT_SECTIONS = ("podcasts", "users", "transactions")
+EXPORT_YIELD_PER = 5000
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+
+def _fmt_dt(value: datetime | None) -> str:
+    return value.strftime('%Y-%m-%d %H:%M') if value else ""
+
+
+def _parse_date(value: str) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _export_sections(sections: list[str], date_from: datetime | None, date_to: datetime | None):
+    """
+    (заголовок, колонки, select, форматтер строки) для каждой секции экспорта.
+    Выбираем кортежи колонок, а не ORM-объекты: ни identity map, ни lazy-load.
+    """
+    P, U, T = models.Podcast, models.User, models.Transaction
+
+    def in_range(stmt, col):
+        if date_from:
+            stmt = stmt.where(col >= date_from)
+        if date_to:
+            stmt = stmt.where(col < date_to)
+        return stmt
+
+    spec = {
+        "podcasts": (
+            "Podcasts",
+            ["id", "title", "category", "published_at", "duration_min", "is_published", "is_free"],
+            in_range(
+                select(P.id, P.title, P.category, P.published_at, P.duration_seconds, P.is_published, P.is_free),
+                P.published_at,
+            ).order_by(P.id.asc()),
+            lambda r: [r[0], r[1], r[2] or "", _fmt_dt(r[3]), (r[4] or 0) // 60, 1 if r[5] else 0, 1 if r[6] else 0],
+        ),
+        "users": (
+            "Users",
+            ["id", "telegram_id", "has_subscription", "created_at"],
+            in_range(select(U.id, U.telegram_id, U.has_subscription, U.created_at), U.created_at).order_by(U.id.asc()),
+            lambda r: [r[0], r[1], 1 if r[2] else 0, _fmt_dt(r[3])],
+        ),
+        "transactions": (
+            "Transactions",
+            ["id", "user_id", "type", "podcast_id", "status", "created_at"],
+            in_range(select(T.id, T.user_id, T.type, T.podcast_id, T.status, T.created_at), T.created_at).order_by(T.id.asc()),
+            lambda r: [r[0], r[1], r[2], r[3] or "", r[4], _fmt_dt(r[5])],
+        ),
+    }
+    return [spec[name] for name in sections]
+
+
+def _iter_export_csv(sections: list[str], date_from: datetime | None, date_to: datetime | None):
+    """Генератор CSV: строки копятся в небольшом буфере и отдаются кусками, память не растёт с объёмом."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    db = SessionLocal()
+    try:
+        yield "\ufeff".encode("utf-8")  # BOM, чтобы Excel понял UTF-8
+        for title, columns, stmt, fmt in _export_sections(sections, date_from, date_to):
+            writer.writerow([title])
+            writer.writerow(columns)
+            for row in db.execute(stmt.execution_options(yield_per=EXPORT_YIELD_PER)):
+                writer.writerow(fmt(row))
+                if buf.tell() >= EXPORT_FLUSH_BYTES:
+                    yield buf.getvalue().encode("utf-8")
+                    buf.seek(0)
+                    buf.truncate()
+            writer.writerow([])
+        yield buf.getvalue().encode("utf-8")
+    finally:
+        db.close()
 
 
 @router.get("/export")
-def export_excel(request: Request, db: Session = Depends(get_db)):
-    """Экспорт данных в CSV (совместимо с Excel без дополнительных зависимостей)."""
-    import io, csv
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Podcasts
-    writer.writerow(["Podcasts"])
-    writer.writerow(["id", "title", "category", "published_at", "duration_min", "is_published", "is_free"])
-    for p in db.query(models.Podcast).order_by(models.Podcast.id.asc()).all():
-        writer.writerow([
-            p.id,
-            p.title,
-            p.category or "",
-            p.published_at.strftime('%Y-%m-%d %H:%M') if p.published_at else "",
-            (p.duration_seconds or 0)//60,
-            1 if p.is_published else 0,
-            1 if getattr(p, 'is_free', False) else 0,
-        ])
-    writer.writerow([])
-
-    # Users
-    writer.writerow(["Users"])
-    writer.writerow(["id", "telegram_id", "has_subscription", "created_at"])
-    for u in db.query(models.User).order_by(models.User.id.asc()).all():
-        writer.writerow([
-            u.id,
-            u.telegram_id,
-            1 if u.has_subscription else 0,
-            u.created_at.strftime('%Y-%m-%d %H:%M') if u.created_at else "",
-        ])
-    writer.writerow([])
-
-    # Transactions
-    writer.writerow(["Transactions"])
-    writer.writerow(["id", "user_id", "type", "podcast_id", "status", "created_at"])
-    for t in db.query(models.Transaction).order_by(models.Transaction.id.asc()).all():
-        writer.writerow([
-            t.id,
-            t.user_id,
-            t.type,
-            t.podcast_id or "",
-            t.status,
-            t.created_at.strftime('%Y-%m-%d %H:%M') if t.created_at else "",
-        ])
-
-    mem = io.BytesIO(output.getvalue().encode('utf-8-sig'))
+def export_excel(request: Request, sections: str = "", date_from: str = "", date_to: str = ""):
+    """
+    Экспорт данных в CSV (совместимо с Excel без дополнительных зависимостей).
+    sections — через запятую из podcasts,users,transactions (по умолчанию все);
+    date_from/date_to — ISO-даты, полуинтервал [date_from, date_to).
+    """
+    if redirect := _guard(request):
+        return redirect
+    selected = [name for name in EXPORT_SECTIONS if name in sections.split(",")] or list(EXPORT_SECTIONS)
     headers = {
         "Content-Disposition": "attachment; filename=export.csv",
         "Content-Type": "text/csv; charset=utf-8",
     }
-    return StreamingResponse(mem, headers=headers, media_type="text/csv")
-
-
+    return StreamingResponse(
+        _iter_export_csv(selected, _parse_date(date_from), _parse_date(date_to)),
+        headers=headers,
+        media_type="text/csv",
+    )
@@ -0,0 +1,114 @@
+"""
+Обработка MP3 без обращения к БД: запускается в процессах-воркерах (app/media_jobs.py).
+
+Превью режется по границам MPEG-кадров, поэтому получается валидный MP3
+без перекодирования.
+"""
+import os
+import tempfile
+
+try:
+    from mutagen.mp3 import MP3
+except Exception:  # pragma: no cover
+    MP3 = None  # type: ignore
+
+
+# kbps по (версия MPEG, слой); индекс — поле bitrate_index заголовка
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+_MAX_FRAME_BYTES_PER_SECOND = 448 * 1000 // 8
+
+
+def parse_frame_header(header: bytes) -> tuple[int, int, int] | None:
+    """(длина кадра в байтах, сэмплов в кадре, частота) или None, если это не заголовок кадра."""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_idx = header[2] >> 4
+    rate_idx = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version_bits == 1 or layer_bits == 0 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None  # reserved / free format
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    samples = 1152 if layer == 2 or version == 1 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def _id3v2_size(head: bytes) -> int:
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def cut_preview(src_path: str, dest_path: str, seconds: int) -> float:
+    """
+    Записать первые ~seconds секунд src_path в dest_path целыми кадрами.
+    Первый кадр с Xing/Info-заголовком пропускается: он описывает длину исходного файла.
+    Возвращает длительность превью в секундах (0 — кадры не найдены, файл не создаётся).
+    """
+    with open(src_path, "rb") as f:
+        offset = _id3v2_size(f.read(10))
+        f.seek(offset)
+        data = f.read(seconds * _MAX_FRAME_BYTES_PER_SECOND + 64 * 1024)
+
+    pos, first, duration = 0, True, 0.0
+    frames: list[bytes] = []
+    while pos + 4 <= len(data) and duration < seconds:
+        parsed = parse_frame_header(data[pos:pos + 4])
+        if not parsed:
+            pos += 1  # resync: ищем следующий заголовок
+            continue
+        length, samples, sample_rate = parsed
+        frame = data[pos:pos + length]
+        if len(frame) < length:
+            break
+        if not (first and (b"Xing" in frame[:64] or b"Info" in frame[:64])):
+            frames.append(frame)
+            duration += samples / sample_rate
+        first = False
+        pos += length
+
+    if not frames:
+        return 0.0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path) or ".", prefix=".preview-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for frame in frames:
+                out.write(frame)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return duration
+
+
+def process_audio(src_path: str, preview_path: str, preview_seconds: int) -> dict:
+    """Длительность, битрейт и превью для загруженного выпуска (выполняется в воркере)."""
+    duration, bitrate_kbps = 0, None
+    if MP3:
+        info = MP3(src_path).info
+        duration = int(info.length)
+        bitrate_kbps = int(info.bitrate / 1000) if info.bitrate else None
+    preview = cut_preview(src_path, preview_path, preview_seconds) if preview_seconds > 0 else 0.0
+    return {
+        "duration_seconds": duration,
+        "bitrate_kbps": bitrate_kbps,
+        "preview_seconds": preview,
+        "preview_path": preview_path if preview else None,
+    }
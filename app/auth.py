@@ -1,12 +1,10 @@
 from typing import Optional
 from fastapi import APIRouter, Request, Depends, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 
 from .config import settings
-
-templates = Jinja2Templates(directory="templates")
+from .templating import templates
 
 router = APIRouter(prefix="/admin")
 
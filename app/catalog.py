@@ -0,0 +1,235 @@
+"""
+Кэш каталога: карточки проектов, подкасты и цены.
+
+Данные меняются только из админки, поэтому читаем их из неизменяемых снимков.
+Админские обработчики вызывают bump() после коммита, и следующий читатель
+перечитывает снимок. Остальные процессы узнают о bump через app/invalidation.py,
+TTL — страховка на случай, если это сообщение потерялось.
+"""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+from . import invalidation, models
+
+
+@dataclass(frozen=True)
+class CardSnapshot:
+    id: int
+    title: str
+    url: str
+    order: int
+    icon: str | None
+    is_internal: bool
+
+
+@dataclass(frozen=True)
+class PodcastSnapshot:
+    id: int
+    title: str
+    description: str | None
+    category: str | None
+    published_at: datetime | None
+    duration_seconds: int
+    cover_path: str | None
+    audio_preview_path: str | None
+    audio_full_path: str | None
+    is_published: bool
+    is_free: bool
+    # производные обложки: ((mime, srcset), ...) от лучшего формата к худшему
+    cover_sources: tuple[tuple[str, str], ...] = ()
+    cover_width: int | None = None
+    cover_height: int | None = None
+
+
+@dataclass(frozen=True)
+class PriceBook:
+    """Цены в копейках: подписка и разовые покупки выпусков."""
+
+    subscription_cents: int
+    podcast_cents: MappingProxyType
+
+    def podcast_price(self, podcast_id: int) -> int:
+        return self.podcast_cents.get(podcast_id, 0)
+
+
+_lock = threading.RLock()  # published_podcasts() строится поверх podcasts_by_id()
+_version = 0
+_snapshots: dict[str, tuple[int, float, Any]] = {}
+hits = 0
+misses = 0
+
+
+def version() -> int:
+    return _version
+
+
+def _bump_local(_key: str | None = None) -> None:
+    global _version
+    with _lock:
+        _version += 1
+
+
+def bump() -> None:
+    """Сообщить, что каталог изменился (вызывать после commit)."""
+    _bump_local()
+    invalidation.publish("catalog")
+
+
+invalidation.register("catalog", _bump_local)
+
+
+def _cached(name: str, db: Session, loader: Callable[[Session], Any]) -> Any:
+    global hits, misses
+    invalidation.sync()
+    snap = _snapshots.get(name)
+    if snap and snap[0] == _version and time.monotonic() - snap[1] < settings.catalog_cache_ttl_seconds:
+        hits += 1
+        return snap[2]
+    with _lock:
+        snap = _snapshots.get(name)
+        if snap and snap[0] == _version and time.monotonic() - snap[1] < settings.catalog_cache_ttl_seconds:
+            hits += 1
+            return snap[2]
+        misses += 1
+        loaded_version = _version
+        value = loader(db)
+        _snapshots[name] = (loaded_version, time.monotonic(), value)
+        return value
+
+
+def _load_cards(db: Session) -> tuple[CardSnapshot, ...]:
+    rows = (
+        db.query(models.ProjectCard)
+        .order_by(models.ProjectCard.order.asc(), models.ProjectCard.id.asc())
+        .all()
+    )
+    return tuple(
+        CardSnapshot(
+            id=c.id, title=c.title, url=c.url, order=c.order or 0, icon=c.icon, is_internal=bool(c.is_internal)
+        )
+        for c in rows
+    )
+
+
+_COVER_FORMATS = ("avif", "webp")
+
+
+def _load_cover_variants(db: Session) -> dict[int, dict]:
+    """podcast_id -> {"sources": ..., "width": ..., "height": ...} одним запросом."""
+    v = models.CoverVariant
+    grouped: dict[int, dict[str, list[tuple[int, int, str]]]] = {}
+    for podcast_id, fmt, width, height, path in db.query(v.podcast_id, v.format, v.width, v.height, v.path).order_by(
+        v.podcast_id, v.width
+    ):
+        grouped.setdefault(podcast_id, {}).setdefault(fmt, []).append((width, height, path))
+    result = {}
+    for podcast_id, by_format in grouped.items():
+        sources = tuple(
+            (f"image/{fmt}", ", ".join(f"{path} {width}w" for width, _, path in by_format[fmt]))
+            for fmt in _COVER_FORMATS
+            if fmt in by_format
+        )
+        largest = max((item for items in by_format.values() for item in items), key=lambda item: item[0])
+        result[podcast_id] = {"sources": sources, "width": largest[0], "height": largest[1]}
+    return result
+
+
+def _load_podcasts(db: Session) -> dict[int, PodcastSnapshot]:
+    rows = db.query(models.Podcast).order_by(models.Podcast.published_at.desc(), models.Podcast.id.desc()).all()
+    covers = _load_cover_variants(db)
+    # dict сохраняет порядок: по убыванию даты публикации
+    return {
+        p.id: PodcastSnapshot(
+            id=p.id,
+            title=p.title,
+            description=p.description,
+            category=p.category,
+            published_at=p.published_at,
+            duration_seconds=p.duration_seconds or 0,
+            cover_path=p.cover_path,
+            audio_preview_path=p.audio_preview_path,
+            audio_full_path=p.audio_full_path,
+            is_published=bool(p.is_published),
+            is_free=bool(p.is_free),
+            cover_sources=covers.get(p.id, {}).get("sources", ()),
+            cover_width=covers.get(p.id, {}).get("width"),
+            cover_height=covers.get(p.id, {}).get("height"),
+        )
+        for p in rows
+    }
+
+
+def _load_prices(db: Session) -> PriceBook:
+    cfg = db.query(models.AppConfig).first()
+    prices = {
+        podcast_id: price_cents or 0
+        for podcast_id, price_cents in db.query(models.PodcastPrice.podcast_id, models.PodcastPrice.price_cents)
+    }
+    return PriceBook(
+        subscription_cents=(cfg.subscription_price_cents if cfg else 0) or 0,
+        podcast_cents=MappingProxyType(prices),
+    )
+
+
+def project_cards(db: Session) -> tuple[CardSnapshot, ...]:
+    return _cached("cards", db, _load_cards)
+
+
+def podcasts_by_id(db: Session) -> dict[int, PodcastSnapshot]:
+    return _cached("podcasts", db, _load_podcasts)
+
+
+def _load_published(db: Session) -> tuple[str, tuple[PodcastSnapshot, ...]]:
+    podcasts = tuple(p for p in podcasts_by_id(db).values() if p.is_published)
+    return hashlib.blake2b(repr(podcasts).encode("utf-8"), digest_size=8).hexdigest(), podcasts
+
+
+def published_listing(db: Session) -> tuple[str, tuple[PodcastSnapshot, ...]]:
+    """
+    Опубликованные подкасты и хэш именно этого списка — одна запись кэша. ETag страницы
+    и ключ кэша фрагмента берутся из хэша, поэтому не могут разойтись с отданными данными.
+    """
+    return _cached("published", db, _load_published)
+
+
+def published_podcasts(db: Session) -> tuple[PodcastSnapshot, ...]:
+    return published_listing(db)[1]
+
+
+def price_book(db: Session) -> PriceBook:
+    return _cached("prices", db, _load_prices)
+
+
+def _load_fingerprint(db: Session) -> str:
+    prices = price_book(db)
+    content = (
+        project_cards(db),
+        tuple(podcasts_by_id(db).values()),
+        prices.subscription_cents,
+        sorted(prices.podcast_cents.items()),
+    )
+    return hashlib.blake2b(repr(content).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def fingerprint(db: Session) -> str:
+    """
+    Хэш содержимого каталога для ETag страниц. В отличие от version() одинаков во всех
+    воркерах и после перезапуска, если данные те же.
+    """
+    return _cached("fingerprint", db, _load_fingerprint)
+
+
+def get_podcast(db: Session, podcast_id: int) -> PodcastSnapshot | None:
+    return podcasts_by_id(db).get(podcast_id)
+
+
+def cache_stats() -> dict:
+    return {"hits": hits, "misses": misses, "version": _version}
@@ -0,0 +1,42 @@
+"""
+Условные GET для персональных страниц Mini App (/, /podcasts, /podcasts/{id}).
+
+Слабый ETag собирается из того, от чего зависит HTML: отпечаток каталога, отпечаток
+шаблонов и данные пользователя, влияющие на страницу. Сравнение идёт до рендера,
+совпадение — пустой 304. Cache-Control: private, no-cache — страница персональная,
+в общих кэшах не хранится, а браузер WebView каждый раз переспрашивает с If-None-Match.
+"""
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .templating import templates_fingerprint
+
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def page_etag(*parts: object) -> str:
+    raw = "|".join(str(p) for p in (templates_fingerprint(), *parts))
+    return 'W/"' + hashlib.blake2b(raw.encode("utf-8"), digest_size=10).hexdigest() + '"'
+
+
+def _opaque(tag: str) -> str:
+    # слабое сравнение: W/"x" и "x" совпадают
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """304, если If-None-Match совпадает с etag (слабое сравнение), иначе None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = {_opaque(c.strip()) for c in header.split(",")}
+    if "*" in candidates or _opaque(etag) in candidates:
+        return Response(status_code=304, headers=validators(etag))
+    return None
+
+
+def validators(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
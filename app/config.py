@@ -16,7 +16,74 @@ class Settings(BaseModel):
     payform_url: str = os.getenv("PAYFORM_URL", "https://demo.payform.ru/")
     payform_secret: str = os.getenv("PAYFORM_SECRET", "2y2aw4oknnke80bp1a8fniwuuq7tdkwmmuq7vwi4nzbr8z1182ftbn6p8mhw3bhz")
     payform_sys: str = os.getenv("PAYFORM_SYS", "")
+    # Database engine profile
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "1") not in {"0", "false", "False", ""}
+    # SQLite pragmas, applied to every new connection
+    sqlite_journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    sqlite_cache_size_kib: int = int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024)))
 
+    # In-process user/entitlement cache (per worker; other workers drop entries via cache_invalidations)
+    user_cache_size: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    user_cache_ttl_seconds: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    # Dashboard counters drift fix (seconds, 0 = only on startup)
+    stats_reconcile_interval_seconds: float = float(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "600"))
+    # Catalog snapshots (cards/podcasts); bumped by admin edits, TTL is a fallback if a bump is lost
+    catalog_cache_ttl_seconds: float = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "30"))
+    # How often each process polls cache_invalidations for other workers' changes (seconds, 0 = off:
+    # single worker only, or staleness up to the cache TTLs)
+    cache_sync_seconds: float = float(os.getenv("CACHE_SYNC_SECONDS", "1"))
+    # Audio delivery: when set (e.g. "/protected-uploads"), nginx serves files via X-Accel-Redirect
+    media_x_accel_prefix: str = os.getenv("MEDIA_X_ACCEL_PREFIX", "")
+    # Admin uploads size limit
+    max_upload_mb: int = int(os.getenv("MAX_UPLOAD_MB", "1024"))
+    # Media processing: worker processes (0 = run tools/media_worker.py separately), poll interval,
+    # per-batch timeout (a stuck decode is killed and the job retried), preview length
+    media_workers: int = int(os.getenv("MEDIA_WORKERS", "2"))
+    media_jobs_poll_seconds: float = float(os.getenv("MEDIA_JOBS_POLL_SECONDS", "2"))
+    media_job_timeout_seconds: float = float(os.getenv("MEDIA_JOB_TIMEOUT_SECONDS", "600"))
+    preview_seconds: int = int(os.getenv("PREVIEW_SECONDS", "60"))
+    # Cover derivatives: target widths (px) and encoder quality
+    cover_widths: str = os.getenv("COVER_WIDTHS", "320,640,960")
+    cover_quality: int = int(os.getenv("COVER_QUALITY", "75"))
+    # Logging: level, format (json/text), queue listener, per-logger sampling
+    # ("app.http=0.01" keeps 1% of INFO lines, warnings/errors always), header dumps (off/errors/all)
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "json").lower()
+    log_queue: bool = os.getenv("LOG_QUEUE", "1").lower() in ("1", "true", "yes")
+    log_sampling: str = os.getenv("LOG_SAMPLING", "")
+    log_headers: str = os.getenv("LOG_HEADERS", "errors").lower()
+    # Request body snippets in access logs: only these paths, first N bytes, never multipart
+    log_body_paths: str = os.getenv("LOG_BODY_PATHS", "/api/telegram/auth,/checkout")
+    log_body_bytes: int = int(os.getenv("LOG_BODY_BYTES", "2048"))
+    # Telegram initData: max auth_date age (seconds, 0 = no check) and cache of verified strings
+    telegram_auth_max_age_seconds: int = int(os.getenv("TELEGRAM_AUTH_MAX_AGE_SECONDS", "86400"))
+    telegram_auth_cache_size: int = int(os.getenv("TELEGRAM_AUTH_CACHE_SIZE", "10000"))
+    telegram_auth_cache_ttl_seconds: float = float(os.getenv("TELEGRAM_AUTH_CACHE_TTL_SECONDS", "300"))
+    # Payform webhook inbox: consumer poll interval (seconds) and batch size
+    payment_events_poll_seconds: float = float(os.getenv("PAYMENT_EVENTS_POLL_SECONDS", "1"))
+    payment_events_batch_size: int = int(os.getenv("PAYMENT_EVENTS_BATCH_SIZE", "100"))
+    # Checkout: reuse an identical pending order for this long (seconds, 0 = always new);
+    # reaper marks older pending as expired and archives expired after N days (0 = keep)
+    pending_reuse_seconds: int = int(os.getenv("PENDING_REUSE_SECONDS", "900"))
+    pending_expire_seconds: int = int(os.getenv("PENDING_EXPIRE_SECONDS", "86400"))
+    transactions_archive_days: int = int(os.getenv("TRANSACTIONS_ARCHIVE_DAYS", "30"))
+    pending_reaper_interval_seconds: float = float(os.getenv("PENDING_REAPER_INTERVAL_SECONDS", "3600"))
+    # /metrics (Prometheus text format): admin session or "Authorization: Bearer <METRICS_TOKEN>"
+    metrics_token: str = os.getenv("METRICS_TOKEN", "")
+    # Per-request SQL profiling (logger app.sql, Server-Timing header): off by default
+    sql_profile: bool = os.getenv("SQL_PROFILE", "0").lower() in ("1", "true", "yes")
+    sql_profile_slow_ms: float = float(os.getenv("SQL_PROFILE_SLOW_MS", "200"))
+    sql_profile_max_queries: int = int(os.getenv("SQL_PROFILE_MAX_QUERIES", "20"))
+    sql_profile_repeat: int = int(os.getenv("SQL_PROFILE_REPEAT", "5"))  # same SQL this many times = N+1
+    # Templates: compiled bytecode cache dir ("" = off); re-check template files on every render (dev only)
+    templates_cache_dir: str = os.getenv("TEMPLATES_CACHE_DIR", os.path.join(os.getenv("DATA_DIR", "data"), "jinja-cache"))
+    templates_auto_reload: bool = os.getenv("TEMPLATES_AUTO_RELOAD", "0").lower() in ("1", "true", "yes")
 
 settings = Settings()
 
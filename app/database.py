@@ -1,7 +1,10 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
+from .config import settings
+
 # Allow overriding via env; default to writable subdir ./data
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -9,14 +12,74 @@ if not DATABASE_URL:
     os.makedirs(DATA_DIR, exist_ok=True)
     DATABASE_URL = f"sqlite:///./{DATA_DIR}/app.db"
 
-# check_same_thread=False is required only for SQLite used with threads (uvicorn)
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs: dict = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if url.startswith("sqlite"):
+        # check_same_thread=False is required only for SQLite used with threads (uvicorn);
+        # timeout is the driver-level busy wait, kept in sync with PRAGMA busy_timeout
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_ms / 1000,
+        }
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            # in-memory DB lives in a single connection, pool sizing does not apply
+            return kwargs
+    kwargs.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+    )
+    return kwargs
+
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+
+
+if engine.dialect.name == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL + relaxed fsync: readers are not blocked by webhook commits."""
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+            # negative value = size in KiB rather than in pages
+            cursor.execute(f"PRAGMA cache_size=-{abs(int(settings.sqlite_cache_size_kib))}")
+        finally:
+            cursor.close()
+
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def ensure_schema() -> None:
+    """
+    create_all пропускает существующие таблицы — досоздаём объявленные позже nullable-колонки
+    (ALTER TABLE ... ADD COLUMN) и индексы. Повторный запуск ничего не меняет.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+    # IF NOT EXISTS вместо checkfirst: отражение индексов по выражению даёт SAWarning
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
 def get_db() -> Session:
     db = SessionLocal()
     try:
@@ -24,3 +87,11 @@ def get_db() -> Session:
     finally:
         db.close()
 
+
+def dialect_insert(db: Session, table):
+    """INSERT с поддержкой .on_conflict_do_nothing() для SQLite и Postgres."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
@@ -0,0 +1,166 @@
+"""
+Материализованные права доступа (таблица user_entitlements).
+
+Проверка доступа к выпуску идёт по ключу (user_id, podcast_id) вместо фильтра по всей истории
+транзакций. Результат держится в кэше UserAccess по telegram_id, поэтому повторные просмотры
+вообще не ходят в БД; webhook и админка сбрасывают запись через invalidate(), в остальных
+процессах она сбрасывается через app/invalidation.py.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import case, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from .config import settings
+from .database import dialect_insert
+from . import invalidation, models
+
+
+# podcast_id, под которым хранится подписка
+SUBSCRIPTION_MARKER = 0
+
+
+def grant(db: Session, user_id: int, podcast_id: int | None, granted_at: datetime | None = None) -> None:
+    """Выдать право (идемпотентно). podcast_id=None — подписка. Коммит — на вызывающей стороне."""
+    table = models.UserEntitlement.__table__
+    stmt = (
+        dialect_insert(db, table)
+        .values(
+            user_id=user_id,
+            podcast_id=SUBSCRIPTION_MARKER if podcast_id is None else podcast_id,
+            granted_at=granted_at or datetime.utcnow(),
+        )
+        .on_conflict_do_nothing()
+    )
+    db.execute(stmt)
+
+
+def grant_many(db: Session, grants: list[tuple[int, int | None]]) -> None:
+    """grant() для списка (user_id, podcast_id) одним executemany. Коммит — на вызывающей стороне."""
+    if not grants:
+        return
+    now = datetime.utcnow()
+    rows = {
+        (user_id, SUBSCRIPTION_MARKER if podcast_id is None else podcast_id): now for user_id, podcast_id in grants
+    }
+    db.execute(
+        dialect_insert(db, models.UserEntitlement.__table__).on_conflict_do_nothing(),
+        [{"user_id": user_id, "podcast_id": podcast_id, "granted_at": at} for (user_id, podcast_id), at in rows.items()],
+    )
+
+
+def revoke(db: Session, user_id: int, podcast_id: int | None) -> None:
+    """Отозвать право. podcast_id=None — подписка. Коммит — на вызывающей стороне."""
+    db.query(models.UserEntitlement).filter(
+        models.UserEntitlement.user_id == user_id,
+        models.UserEntitlement.podcast_id == (SUBSCRIPTION_MARKER if podcast_id is None else podcast_id),
+    ).delete(synchronize_session=False)
+
+
+@dataclass(frozen=True)
+class UserAccess:
+    """Снимок пользователя для гейтинга страниц: без ORM, безопасно держать в кэше."""
+
+    user_id: int
+    telegram_id: str
+    has_subscription: bool
+    podcast_ids: frozenset
+
+    def can_listen(self, podcast_id: int, is_free: bool = False) -> bool:
+        return self.has_subscription or bool(is_free) or podcast_id in self.podcast_ids
+
+
+_access_cache = TTLCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds)
+
+
+def access_for_user(db: Session, user: models.User) -> UserAccess:
+    """Собрать UserAccess по строке users и положить в кэш."""
+    podcast_ids = db.execute(
+        select(models.UserEntitlement.podcast_id).where(
+            models.UserEntitlement.user_id == user.id,
+            models.UserEntitlement.podcast_id != SUBSCRIPTION_MARKER,
+        )
+    ).scalars()
+    access = UserAccess(
+        user_id=user.id,
+        telegram_id=str(user.telegram_id),
+        has_subscription=bool(user.has_subscription),
+        podcast_ids=frozenset(podcast_ids),
+    )
+    _access_cache.set(access.telegram_id, access)
+    return access
+
+
+def get_access(db: Session, telegram_id: str, user_id: int | None = None) -> UserAccess | None:
+    """
+    UserAccess по telegram_id: из кэша, иначе из БД. None — пользователя нет.
+    user_id (из сессии) позволяет читать строку по первичному ключу.
+    """
+    telegram_id = str(telegram_id)
+    invalidation.sync()
+    access = _access_cache.get(telegram_id)
+    if access is not None:
+        return access
+    user = db.get(models.User, user_id) if user_id else None
+    if user is None or str(user.telegram_id) != telegram_id:
+        # telegram_id могли поменять в админке — тогда id из сессии уже не наш
+        user = db.query(models.User).filter(models.User.telegram_id == telegram_id).first()
+    if not user:
+        return None
+    return access_for_user(db, user)
+
+
+def _drop(telegram_id: str | None) -> None:
+    if telegram_id:
+        _access_cache.pop(str(telegram_id))
+
+
+def invalidate(*telegram_ids: str | None) -> None:
+    """Сбросить кэш после изменения подписки или покупок пользователя (вызывать после commit)."""
+    keys = [str(telegram_id) for telegram_id in telegram_ids if telegram_id]
+    for key in keys:
+        _drop(key)
+    if keys:
+        invalidation.publish("access", *keys)
+
+
+invalidation.register("access", _drop)
+
+
+def cache_stats() -> dict:
+    return _access_cache.stats()
+
+
+def backfill(db: Session) -> int:
+    """
+    Заполнить user_entitlements из успешных транзакций и флага has_subscription.
+    Повторный запуск безопасен: существующие строки пропускаются. Возвращает число вставленных строк.
+    """
+    txn = models.Transaction
+    from_txns = (
+        select(
+            txn.user_id,
+            case((txn.type == "subscription", literal(SUBSCRIPTION_MARKER)), else_=txn.podcast_id),
+            func.min(txn.created_at),
+        )
+        .where(txn.status == "success")
+        .where((txn.type == "subscription") | (txn.podcast_id.is_not(None)))
+        .group_by(txn.user_id, txn.type, txn.podcast_id)
+    )
+    from_users = select(
+        models.User.id,
+        literal(SUBSCRIPTION_MARKER),
+        func.coalesce(models.User.created_at, func.current_timestamp()),
+    ).where(models.User.has_subscription.is_(True))
+
+    table = models.UserEntitlement.__table__
+    stmt = (
+        dialect_insert(db, table)
+        .from_select(["user_id", "podcast_id", "granted_at"], union_all(from_txns, from_users))
+        .on_conflict_do_nothing()
+    )
+    result = db.execute(stmt)
+    db.commit()
+    return max(0, result.rowcount or 0)
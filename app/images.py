@@ -0,0 +1,54 @@
+"""
+Производные обложек (WebP/AVIF нескольких ширин) без обращения к БД:
+запускается в процессах-воркерах (app/media_jobs.py).
+"""
+import os
+import tempfile
+
+try:
+    from PIL import Image, ImageOps, features
+except Exception:  # pragma: no cover
+    Image = None  # type: ignore
+
+
+def available_formats() -> list[str]:
+    if not Image:
+        return []
+    return [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+
+
+def _save_atomic(img, dest_path: str, fmt: str, quality: int) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path) or ".", prefix=".cover-", suffix=".part")
+    os.close(fd)
+    try:
+        img.save(tmp_path, format=fmt.upper(), quality=quality)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def process_cover(src_path: str, widths: list[int], quality: int) -> list[dict]:
+    """
+    Уменьшенные копии обложки рядом с оригиналом: <имя>_<w>w.<fmt>.
+    Не увеличиваем: ширины больше оригинала заменяются шириной оригинала.
+    """
+    if not Image:
+        raise RuntimeError("Pillow is not installed")
+    formats = available_formats()
+    stem = os.path.splitext(src_path)[0]
+    variants: list[dict] = []
+    with Image.open(src_path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+        targets = sorted({min(w, original.width) for w in widths if w > 0})
+        for width in targets:
+            height = max(1, round(original.height * width / original.width))
+            resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                dest = f"{stem}_{width}w.{fmt}"
+                _save_atomic(resized, dest, fmt, quality)
+                variants.append({"format": fmt, "width": width, "height": height, "path": dest})
+    return variants
@@ -0,0 +1,86 @@
+"""
+Межпроцессная инвалидация in-process кэшей (таблица cache_invalidations).
+
+Кэши доступа и каталога живут в памяти каждого воркера. publish() после коммита записывает,
+что сбросить; каждый процесс не чаще раза в CACHE_SYNC_SECONDS дочитывает новые строки
+(sync() перед чтением из кэша) и применяет их зарегистрированными обработчиками. Так правка
+из другого воркера или из tools/media_worker видна через ~секунду, а не через TTL кэша;
+TTL остаётся страховкой на случай, если запись не удалась.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import delete, func, insert, select
+
+from .config import settings
+from .database import engine
+from . import models
+
+
+logger = logging.getLogger("app.cache")
+
+# строки старше этого удаляет prune_job(); воркер, отставший сильнее, всё равно сбросится по TTL
+KEEP = timedelta(hours=1)
+
+_handlers: dict[str, Callable[[str | None], None]] = {}
+_lock = threading.Lock()
+_last_id: int | None = None
+_checked_at = 0.0
+
+
+def register(scope: str, handler: Callable[[str | None], None]) -> None:
+    """handler(key) сбрасывает локальный кэш; key=None — весь scope."""
+    _handlers[scope] = handler
+
+
+def publish(scope: str, *keys: str | None) -> None:
+    """Сообщить остальным процессам об изменении (вызывать после commit). Без keys — весь scope."""
+    if settings.cache_sync_seconds <= 0:
+        return
+    now = datetime.utcnow()
+    rows = [{"scope": scope, "key": key, "created_at": now} for key in (keys or (None,))]
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(models.CacheInvalidation), rows)
+    except Exception:
+        logger.exception("cache invalidation publish failed, scope=%s", scope)
+
+
+def sync() -> None:
+    """Применить инвалидации из других процессов. Дёшево: в БД ходит не чаще CACHE_SYNC_SECONDS."""
+    global _last_id, _checked_at
+    interval = settings.cache_sync_seconds
+    if interval <= 0 or time.monotonic() - _checked_at < interval:
+        return
+    if not _lock.acquire(blocking=False):
+        return  # другой поток уже читает
+    try:
+        _checked_at = time.monotonic()
+        table = models.CacheInvalidation
+        with engine.connect() as conn:
+            if _last_id is None:
+                # первый вызов: кэши процесса ещё пусты, старые строки к ним не относятся
+                _last_id = conn.execute(select(func.max(table.id))).scalar() or 0
+                return
+            rows = conn.execute(
+                select(table.id, table.scope, table.key).where(table.id > _last_id).order_by(table.id)
+            ).all()
+        for row in rows:
+            handler = _handlers.get(row.scope)
+            if handler:
+                handler(row.key)
+            _last_id = row.id
+    except Exception:
+        logger.exception("cache invalidation sync failed")
+    finally:
+        _lock.release()
+
+
+def prune_job() -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            delete(models.CacheInvalidation).where(models.CacheInvalidation.created_at < datetime.utcnow() - KEEP)
+        )
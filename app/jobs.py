@@ -0,0 +1,47 @@
+"""Периодические фоновые задачи внутри процесса приложения."""
+import asyncio
+import logging
+from typing import Callable
+
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger("app.jobs")
+
+
+def schedule(
+    app: FastAPI,
+    name: str,
+    interval: float,
+    func: Callable[[], object],
+    on_shutdown: Callable[[], object] | None = None,
+) -> None:
+    """
+    Запускать sync-функцию func в threadpool при старте приложения и затем каждые interval секунд.
+    interval <= 0 — только один раз при старте. Ошибки логируются и не останавливают цикл.
+    on_shutdown вызывается при остановке приложения (освободить пулы и т.п.).
+    """
+    tasks: list[asyncio.Task] = []
+
+    async def _loop() -> None:
+        while True:
+            try:
+                await run_in_threadpool(func)
+            except Exception:
+                logger.exception("job %s failed", name)
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    @app.on_event("startup")
+    async def _start() -> None:
+        tasks.append(asyncio.create_task(_loop(), name=f"job:{name}"))
+
+    @app.on_event("shutdown")
+    async def _stop() -> None:
+        for task in tasks:
+            task.cancel()
+        tasks.clear()
+        if on_shutdown is not None:
+            on_shutdown()
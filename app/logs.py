@@ -0,0 +1,194 @@
+"""
+Настройка логирования: QueueHandler в процессе запроса, запись в stdout — в отдельном потоке
+QueueListener. Формат — JSON-строки (или текст), сэмплирование по имени логгера.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+
+# атрибуты LogRecord, которые не являются полями из extra=
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "taskName"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+_BODY_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+_BODY_STATE_KEY = "log_body"
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из extra= попадают на верхний уровень."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат; поля из extra= дописываются как key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        extra = _extra_fields(record)
+        return line + "".join(f" {k}={v}" for k, v in extra.items()) if extra else line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю rate записей уровня INFO и ниже; WARNING и выше — всегда.
+    Правило выбирается по самому длинному префиксу имени логгера.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare() сразу форматирует запись в текст; нам нужны поля для JSON,
+        # поэтому только подставляем аргументы и превращаем traceback в строку.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_sampling(value: str) -> dict[str, float]:
+    """'app.http=0.01,app.access=0.1' -> {'app.http': 0.01, 'app.access': 0.1}"""
+    rates = {}
+    for part in value.split(","):
+        name, sep, rate = part.partition("=")
+        if sep and name.strip():
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+def setup_logging() -> None:
+    """Подключить обработчики к корневому логгеру (один раз на процесс)."""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(settings.log_level.upper())
+    if any(getattr(h, "_app_handler", False) for h in root.handlers):
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(TextFormatter())
+
+    if settings.log_queue:
+        handler: logging.Handler = _QueueHandler(queue.SimpleQueue())
+        _listener = logging.handlers.QueueListener(handler.queue, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+    else:
+        handler = stream
+    handler.addFilter(SamplingFilter(parse_sampling(settings.log_sampling)))
+    handler._app_handler = True  # type: ignore[attr-defined]
+    root.addHandler(handler)
+
+
+def want_headers(error: bool = False) -> bool:
+    """Нужен ли дамп заголовков: LOG_HEADERS=all — всегда, errors — только для ошибок, off — никогда."""
+    return settings.log_headers == "all" or (error and settings.log_headers == "errors")
+
+
+class BodyPeekMiddleware:
+    """
+    Копирует первые limit байт тела запроса для лога, пока эндпоинт читает поток:
+    receive оборачивается, сообщения уходят дальше без изменений, тело целиком не буферизуется.
+    Работает только для путей из paths; multipart (загрузки) не трогаем вовсе.
+    """
+
+    def __init__(self, app: ASGIApp, paths: set[str], limit: int):
+        self.app = app
+        self.paths = paths
+        self.limit = limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or self.limit <= 0
+            or scope["method"] not in _BODY_METHODS
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+        content_type = next((v for k, v in scope["headers"] if k == b"content-type"), b"")
+        if content_type.lower().startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        captured = bytearray()
+        scope.setdefault("state", {})[_BODY_STATE_KEY] = captured
+
+        async def peek() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and len(captured) <= self.limit:
+                # +1 байт, чтобы знать, что тело длиннее лимита
+                captured.extend(message.get("body", b"")[: self.limit + 1 - len(captured)])
+            return message
+
+        await self.app(scope, peek, send)
+
+
+def body_snippet(request: Request, limit: int | None = None) -> str:
+    """Сниппет тела, снятый BodyPeekMiddleware ("" — если путь не в списке или тело не читалось)."""
+    captured = request.scope.get("state", {}).get(_BODY_STATE_KEY)
+    if not captured:
+        return ""
+    limit = settings.log_body_bytes if limit is None else limit
+    text = bytes(captured[:limit]).decode("utf-8", errors="replace")
+    return text + "..." if len(captured) > limit else text
+
+
+def headers_dump(request: Request) -> dict:
+    """Безопасный дамп заголовков с нижним регистром ключей."""
+    try:
+        return {k.lower(): (v if len(v) <= 4096 else v[:4096] + "...") for k, v in request.headers.items()}
+    except Exception:
+        return {}
@@ -1,21 +1,21 @@
 import logging
-import sys
 import time
 from fastapi import FastAPI, Depends, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.exceptions import RequestValidationError
 
-from .database import Base, engine, get_db
-from . import models
+from .database import Base, SessionLocal, engine, ensure_schema, get_db
+from . import catalog, conditional, entitlements, invalidation, jobs, logs, media_jobs, metrics, payment_events, sqlprofile, stats, transactions, users
 from .auth import router as auth_router
-from .admin import router as admin_router
+from .admin import router as admin_router, UploadLimitMiddleware
 from .config import settings
 from .public import router as public_router
-from .payments import router as payments_router, build_payform_link
+from .payments import router as payments_router, cached_payform_link
+from .media import router as media_router, audio_url
+from .templating import templates
 
 
 ACCESS_LOGGER_NAME = "app.access"
@@ -23,30 +23,30 @@ HTTP_LOGGER_NAME = "app.http"
 ERROR_LOGGER_NAME = "app.errors"
 
 
-def _headers_dump(request: Request, limit: int = 50) -> dict:
-    """Безопасный дамп заголовков с нижним регистром ключей."""
-    try:
-        return {k.lower(): (v if len(v) <= 4096 else v[:4096] + "...") for k, v in request.headers.items()}
-    except Exception:
-        return {}
-
-def _body_snippet(body: bytes, limit: int = 2048) -> str:
-    if not body:
-        return ""
-    if len(body) > limit:
-        return body[:limit].decode("utf-8", errors="replace") + "..."
-    return body.decode("utf-8", errors="replace")
+def _access_fields(request: Request, start: float, status: int | None, body: str, with_headers: bool) -> dict:
+    """Поля access-строки для JSON-лога (extra=)."""
+    fields = {
+        "method": request.method,
+        "path": request.url.path,
+        "status": status,
+        "dur_ms": round((time.perf_counter() - start) * 1000, 2),
+        "ip": request.client.host if request.client else "-",
+        "xff": request.headers.get("x-forwarded-for", ""),
+        "ua": request.headers.get("user-agent", ""),
+        "ref": request.headers.get("referer", ""),
+        "origin": request.headers.get("origin", ""),
+        "clen": request.headers.get("content-length", "-"),
+    }
+    if body:
+        fields["body_snippet"] = body
+    if with_headers:
+        fields["headers"] = logs.headers_dump(request)
+    return fields
 
 
 def create_app() -> FastAPI:
-    # Configure logging for app.* loggers to stdout
-    root_logger = logging.getLogger()
-    if not any(isinstance(h, logging.StreamHandler) for h in root_logger.handlers):
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
-        handler.setFormatter(formatter)
-        root_logger.addHandler(handler)
-    root_logger.setLevel(logging.INFO)
+    # Logging for app.* loggers: JSON lines to stdout through a background queue listener
+    logs.setup_logging()
 
     app = FastAPI(title="PL Mini App")
 
@@ -54,13 +54,46 @@ def create_app() -> FastAPI:
     app.mount("/static", StaticFiles(directory="static"), name="static")
     app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
-    templates = Jinja2Templates(directory="templates")
-
     # Create tables
     Base.metadata.create_all(bind=engine)
+    _db = SessionLocal()
+    try:
+        # до создания uq_transactions_pending_item в уже существующей базе
+        transactions.expire_duplicate_pending(_db)
+    finally:
+        _db.close()
+    ensure_schema()
+    metrics.instrument_engine(engine)
+    sqlprofile.instrument_engine(engine)
+
+    # Background jobs
+    _db = SessionLocal()
+    try:
+        stats.ensure_row(_db)
+    finally:
+        _db.close()
+    jobs.schedule(app, "stats_reconcile", settings.stats_reconcile_interval_seconds, stats.reconcile_job)
+    jobs.schedule(app, "payment_events", settings.payment_events_poll_seconds, payment_events.apply_pending)
+    jobs.schedule(app, "pending_reaper", settings.pending_reaper_interval_seconds, transactions.reap_job)
+    if settings.cache_sync_seconds > 0:
+        jobs.schedule(app, "cache_invalidations_prune", 600, invalidation.prune_job)
+    if settings.media_workers > 0:
+        jobs.schedule(
+            app, "media_jobs", settings.media_jobs_poll_seconds, media_jobs.dispatch, on_shutdown=media_jobs.shutdown
+        )
 
+    # MAX_UPLOAD_MB for admin uploads, checked before the multipart body is spooled
+    app.add_middleware(UploadLimitMiddleware)
     # Session middleware for admin auth
     app.add_middleware(SessionMiddleware, secret_key=settings.secret_key)
+    # Request body snippets for the access log (allow-listed paths only, never multipart)
+    app.add_middleware(
+        logs.BodyPeekMiddleware,
+        paths={p.strip() for p in settings.log_body_paths.split(",") if p.strip()},
+        limit=settings.log_body_bytes,
+    )
+    # SQL count/time per request (SQL_PROFILE=1 or inside sqlprofile.query_budget)
+    app.add_middleware(sqlprofile.ProfileMiddleware)
 
     # --- ЛОГИРОВАНИЕ: middleware доступа и тела запроса ---
     access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
@@ -70,81 +103,52 @@ def create_app() -> FastAPI:
     @app.middleware("http")
     async def log_requests(request: Request, call_next):
         """
-        Единый access-лог: метод, путь, статус, время, ip, длины, заголовки (сниппет),
-        плюс сниппет тела для интересных эндпоинтов.
+        Единый access-лог: метод, путь, статус, время, ip, длины, заголовки (по LOG_HEADERS),
+        плюс сниппет тела для интересных эндпоинтов. 4xx пишутся как warning, 5xx — error,
+        поэтому сэмплирование app.http их не отбрасывает.
         """
         start = time.perf_counter()
-        client_ip = request.client.host if request.client else "-"
-        ua = request.headers.get("user-agent", "")
-        ref = request.headers.get("referer", "")
-        origin = request.headers.get("origin", "")
-        xff = request.headers.get("x-forwarded-for", "")
-
-        # считать тело безопасно: Starlette кэширует его и дальше form()/json() будет работать
-        raw_body = b""
-        try:
-            # Логируем тело только для POST/PUT/PATCH/DELETE и только для наших внутренних путей,
-            # чтобы не зашумлять логи
-            if request.method in {"POST", "PUT", "PATCH", "DELETE"}:
-                raw_body = await request.body()
-        except Exception as e:
-            error_logger.debug("failed to read request body: %r", e)
-
-        headers_dump = _headers_dump(request)
-
-        # Узкий таргет: развёрнутый сниппет показываем для auth и checkout
-        body_for_log = ""
-        if request.url.path in {"/api/telegram/auth", "/checkout"}:
-            body_for_log = _body_snippet(raw_body, limit=2048)
-
+        metrics.request_started()
+        # Тело здесь не читаем: сниппет для LOG_BODY_PATHS снимает BodyPeekMiddleware,
+        # пока эндпоинт сам читает поток (загрузки не буферизуются в памяти)
         try:
             response = await call_next(request)
             status = response.status_code
         except Exception as exc:
+            metrics.request_finished(request, 500, time.perf_counter() - start)
             # Неловленные исключения тоже логируем
-            duration_ms = int((time.perf_counter() - start) * 1000)
             error_logger.exception(
-                "unhandled exception: method=%s path=%s ip=%s xff=%s ua=%s ref=%s origin=%s "
-                "dur_ms=%s headers=%s body_snippet=%s",
-                request.method, request.url.path, client_ip, xff, ua, ref, origin,
-                duration_ms, headers_dump, body_for_log
+                "unhandled exception: %s %s",
+                request.method,
+                request.url.path,
+                extra=_access_fields(request, start, None, logs.body_snippet(request), logs.want_headers(error=True)),
             )
             # Пробрасываем дальше, чтобы сработал глобальный error handler FastAPI
             raise
 
-        duration_ms = int((time.perf_counter() - start) * 1000)
-        http_logger.info(
-            "access: %s %s -> %s (%sms) ip=%s xff=%s ua=%s ref=%s origin=%s clen=%s headers=%s body_snippet=%s",
-            request.method,
-            request.url.path,
-            status,
-            duration_ms,
-            client_ip,
-            xff,
-            ua,
-            ref,
-            origin,
-            request.headers.get("content-length", "-"),
-            headers_dump,
-            body_for_log,
-        )
+        metrics.request_finished(request, status, time.perf_counter() - start)
+        level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        # isEnabledFor дешевле сборки полей, когда уровень app.http поднят
+        if http_logger.isEnabledFor(level):
+            http_logger.log(
+                level,
+                "access: %s %s -> %s",
+                request.method,
+                request.url.path,
+                status,
+                extra=_access_fields(
+                    request, start, status, logs.body_snippet(request), logs.want_headers(error=status >= 400)
+                ),
+            )
         return response
 
     # --- ЛОГИРОВАНИЕ: обработчики ошибок валидации/400 ---
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
-        body = b""
-        try:
-            body = await request.body()
-        except Exception:
-            pass
-        error_logger.warning(
-            "422 validation error: path=%s headers=%s body=%s errors=%s",
-            request.url.path,
-            _headers_dump(request),
-            _body_snippet(body, 2048),
-            exc.errors(),
-        )
+        fields = {"path": request.url.path, "body": logs.body_snippet(request), "errors": exc.errors()}
+        if logs.want_headers(error=True):
+            fields["headers"] = logs.headers_dump(request)
+        error_logger.warning("422 validation error: %s", request.url.path, extra=fields)
         return JSONResponse({"detail": exc.errors()}, status_code=422)
 
     # Routers
@@ -152,6 +156,8 @@ def create_app() -> FastAPI:
     app.include_router(admin_router)
     app.include_router(public_router)
     app.include_router(payments_router)
+    app.include_router(media_router)
+    app.include_router(metrics.router)
 
     def _require_telegram(request: Request):
         if not request.session.get("telegram_id"):
@@ -175,13 +181,12 @@ def create_app() -> FastAPI:
                 request.headers.get("user-agent", ""),
             )
             return templates.TemplateResponse("front/loader.html", {"request": request})
-        cards = (
-            db.query(models.ProjectCard)
-            .order_by(models.ProjectCard.order.asc(), models.ProjectCard.id.asc())
-            .all()
-        )
+        etag = conditional.page_etag("home", catalog.fingerprint(db))
+        if cached := conditional.not_modified(request, etag):
+            return cached
+        cards = catalog.project_cards(db)
         return templates.TemplateResponse(
-            "front/index.html", {"request": request, "cards": cards}
+            "front/index.html", {"request": request, "cards": cards}, headers=conditional.validators(etag)
         )
 
     @app.get("/podcasts", response_class=HTMLResponse)
@@ -193,14 +198,15 @@ def create_app() -> FastAPI:
                 request.headers.get("user-agent", ""),
             )
             return templates.TemplateResponse("front/loader.html", {"request": request})
-        podcasts = (
-            db.query(models.Podcast)
-            .filter(models.Podcast.is_published.is_(True))
-            .order_by(models.Podcast.published_at.desc())
-            .all()
-        )
+        # хэш и список из одного снимка: ETag и ключ фрагмента сетки совпадают с отданными данными
+        listing_key, podcasts = catalog.published_listing(db)
+        etag = conditional.page_etag("podcasts", listing_key)
+        if cached := conditional.not_modified(request, etag):
+            return cached
         return templates.TemplateResponse(
-            "front/podcasts.html", {"request": request, "podcasts": podcasts}
+            "front/podcasts.html",
+            {"request": request, "podcasts": podcasts, "listing_key": listing_key},
+            headers=conditional.validators(etag),
         )
 
     @app.get("/podcasts/{podcast_id}", response_class=HTMLResponse)
@@ -217,16 +223,19 @@ def create_app() -> FastAPI:
                 request.headers.get("user-agent", ""),
             )
             return templates.TemplateResponse("front/loader.html", {"request": request})
-        podcast = db.get(models.Podcast, podcast_id)
+        podcast = catalog.get_podcast(db, podcast_id)
         if not podcast:
             return RedirectResponse("/podcasts")
 
         user = _get_or_create_user(request, db)
-        has_access = _user_has_full_access(user, podcast, db)
+        has_access = _user_has_full_access(user, podcast)
 
-        audio_src = (
-            podcast.audio_full_path if has_access and podcast.audio_full_path else None
-        )
+        # страница зависит от каталога и от того, открыт ли выпуск этому пользователю
+        etag = conditional.page_etag("podcast", podcast.id, catalog.fingerprint(db), has_access)
+        if cached := conditional.not_modified(request, etag):
+            return cached
+
+        audio_src = audio_url(podcast.id, podcast.audio_full_path) if has_access else None
 
         return templates.TemplateResponse(
             "front/podcasts-details.html",
@@ -236,6 +245,7 @@ def create_app() -> FastAPI:
                 "has_access": has_access,
                 "audio_src": audio_src,
             },
+            headers=conditional.validators(etag),
         )
 
     @app.get("/free-issue", response_class=HTMLResponse)
@@ -247,7 +257,7 @@ def create_app() -> FastAPI:
                 request.headers.get("user-agent", ""),
             )
             return templates.TemplateResponse("front/loader.html", {"request": request})
-        podcast = db.get(models.Podcast, podcast_id)
+        podcast = catalog.get_podcast(db, podcast_id)
         if not podcast:
             return RedirectResponse("/podcasts")
         return templates.TemplateResponse(
@@ -255,7 +265,7 @@ def create_app() -> FastAPI:
         )
 
     @app.get("/checkout", response_class=HTMLResponse)
-    def checkout(podcast_id: int | None = None, request: Request = None):
+    def checkout(podcast_id: int | None = None, request: Request = None, db: Session = Depends(get_db)):
         if request and not request.session.get("telegram_id"):
             logging.getLogger(ACCESS_LOGGER_NAME).info(
                 "checkout blocked, no telegram_id: ip=%s ua=%s",
@@ -263,27 +273,10 @@ def create_app() -> FastAPI:
                 request.headers.get("user-agent", ""),
             )
             return templates.TemplateResponse("front/loader.html", {"request": request})
-        # Prices: subscription + selected podcast price
-        from . import models
-        from sqlalchemy.orm import Session
-        db_sess: Session | None = None
-        try:
-            db_sess = get_db().__next__()
-            cfg = db_sess.query(models.AppConfig).first()
-            sub_price_rub = int(((cfg.subscription_price_cents if cfg else 0) or 0) / 100)
-            single_price_rub = 0
-            if podcast_id:
-                pp = db_sess.query(models.PodcastPrice).filter(models.PodcastPrice.podcast_id == podcast_id).first()
-                single_price_rub = int(((pp.price_cents if pp else 0) or 0) / 100)
-        except Exception:
-            sub_price_rub = 0
-            single_price_rub = 0
-        finally:
-            try:
-                if db_sess:
-                    db_sess.close()
-            except Exception:
-                pass
+        # Prices: subscription + selected podcast price (session connects only on a cold price book)
+        prices = catalog.price_book(db)
+        sub_price_rub = prices.subscription_cents // 100
+        single_price_rub = prices.podcast_price(podcast_id) // 100 if podcast_id else 0
 
         return templates.TemplateResponse(
             "front/subscription.html",
@@ -310,33 +303,22 @@ def create_app() -> FastAPI:
             return RedirectResponse("/", status_code=302)
 
         # Build payment link and redirect
+        prices = catalog.price_book(db)
         if tariff == "subscription":
-            cfg = db.query(models.AppConfig).first()
-            price_cents = (cfg.subscription_price_cents if cfg else 0) or 0
+            price_cents = prices.subscription_cents
             item_name = "Подписка"
             target_podcast_id = None
         elif tariff == "single" and podcast_id:
-            pp = (
-                db.query(models.PodcastPrice)
-                .filter(models.PodcastPrice.podcast_id == podcast_id)
-                .first()
-            )
-            price_cents = (pp.price_cents if pp else 0) or 0
-            p = db.get(models.Podcast, podcast_id)
+            price_cents = prices.podcast_price(podcast_id)
+            p = catalog.get_podcast(db, podcast_id)
             item_name = f"Подкаст: {p.title if p else podcast_id}"
             target_podcast_id = podcast_id
         else:
             return RedirectResponse("/checkout", status_code=302)
 
-        txn = models.Transaction(
-            user_id=user.id,
-            type="subscription" if tariff == "subscription" else "single",
-            podcast_id=target_podcast_id,
-            status="pending",
+        txn = transactions.get_or_create_pending(
+            db, user.user_id, "subscription" if tariff == "subscription" else "single", target_podcast_id
         )
-        db.add(txn)
-        db.commit()
-        db.refresh(txn)
 
         rub_amount = max(0, price_cents // 100)
         payload = {
@@ -352,7 +334,7 @@ def create_app() -> FastAPI:
             "urlNotification": settings.webapp_url.rstrip("/") + "/api/payments/webhook",
             "sys": settings.payform_sys or None,
         }
-        link = build_payform_link(payload)
+        link = cached_payform_link(payload)
         return RedirectResponse(link, status_code=302)
 
     @app.get("/success", response_class=HTMLResponse)
@@ -370,41 +352,25 @@ app = create_app()
 
 
 # Helpers
-def _get_or_create_user(request: Request, db: Session) -> models.User | None:
+def _get_or_create_user(request: Request, db: Session) -> entitlements.UserAccess | None:
     tg_id = request.session.get("telegram_id")
     if not tg_id:
         return None
 
-    user = db.query(models.User).filter(models.User.telegram_id == str(tg_id)).first()
-    if not user:
-        user = models.User(telegram_id=str(tg_id))
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        logging.getLogger(ACCESS_LOGGER_NAME).info(
-            "created user for telegram_id=%s ip=%s", tg_id, getattr(request.client, "host", "-")
-        )
-    return user
+    access = entitlements.get_access(db, str(tg_id), request.session.get("user_id"))
+    if access is None:
+        user_id, created = users.upsert(db, str(tg_id))
+        if created:
+            logging.getLogger(ACCESS_LOGGER_NAME).info(
+                "created user for telegram_id=%s ip=%s", tg_id, getattr(request.client, "host", "-")
+            )
+        access = entitlements.get_access(db, str(tg_id), user_id)
+    request.session["user_id"] = access.user_id
+    return access
 
 
-def _user_has_full_access(user: models.User | None, podcast: models.Podcast, db: Session) -> bool:
+def _user_has_full_access(user: entitlements.UserAccess | None, podcast: catalog.PodcastSnapshot) -> bool:
     if not user:
         return False
-    if user.has_subscription:
-        return True
-    # free podcast
-    if podcast.is_free:
-        return True
-    # check single purchase
-    has_single = (
-        db.query(models.Transaction)
-        .filter(
-            models.Transaction.user_id == user.id,
-            models.Transaction.type == "single",
-            models.Transaction.podcast_id == podcast.id,
-            models.Transaction.status == "success",
-        )
-        .first()
-        is not None
-    )
-    return bool(has_single)
+    # subscription, free podcast or single purchase
+    return user.can_listen(podcast.id, podcast.is_free)
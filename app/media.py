@@ -0,0 +1,246 @@
+"""
+Отдача аудио выпусков: byte ranges (в т.ч. multipart), сильные ETag, условные запросы.
+
+URL содержит имя файла (/podcasts/{id}/audio/{filename}), а загрузки никогда не
+перезаписываются на месте, поэтому ответ можно кэшировать на год. Тело уходит
+без копирования в userspace, если это умеет окружение:
+- X-Accel-Redirect, когда перед приложением стоит nginx (MEDIA_X_ACCEL_PREFIX);
+- ASGI-расширение http.response.zerocopysend (os.sendfile на стороне сервера);
+иначе — чтение кусками в threadpool.
+"""
+import hashlib
+import mimetypes
+import os
+import secrets
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse, Response
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+from .config import settings
+from .database import get_db
+from . import catalog, entitlements
+
+
+router = APIRouter()
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 16
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def audio_url(podcast_id: int, web_path: str | None) -> str | None:
+    """Ссылка на эндпоинт отдачи для сохранённого пути вида /uploads/<file>."""
+    if not web_path:
+        return None
+    return f"/podcasts/{podcast_id}/audio/{os.path.basename(web_path)}"
+
+
+def make_etag(st: os.stat_result, name: str) -> str:
+    """Сильный ETag: файл не меняется на месте, а (имя, размер, mtime) его однозначно задают."""
+    digest = hashlib.blake2b(f"{name}:{st.st_size}:{st.st_mtime_ns}".encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def parse_ranges(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    Разобрать Range: bytes=a-b,c-,-n в список полуинтервалов [start, end).
+    None — заголовок некорректен/слишком сложен (игнорируем и отдаём файл целиком),
+    [] — ни один диапазон не попадает в файл (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges: list[tuple[int, int]] = []
+    parts = [p.strip() for p in spec.split(",") if p.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+    for part in parts:
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size
+            else:
+                start = int(first)
+                if last != "" and int(last) < start:
+                    return None
+                end = size if last == "" else min(size, int(last) + 1)
+        except ValueError:
+            return None
+        if start < end:
+            ranges.append((start, end))
+    # склеиваем пересекающиеся и соседние диапазоны
+    ranges.sort()
+    merged: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class RangeFileResponse(Response):
+    """Ответ файлом с поддержкой Range/If-Range/If-None-Match."""
+
+    def __init__(self, path: str, st: os.stat_result, request_headers: Headers, media_type: str | None = None):
+        self.path = path
+        self.st = st
+        self.size = st.st_size
+        self.etag = make_etag(st, os.path.basename(path))
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.background = None
+        self.body = b""
+        self.status_code = 200
+        self.ranges: list[tuple[int, int]] = [(0, self.size)]
+        self.boundary = ""
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": self.etag,
+            "last-modified": self.last_modified,
+            "cache-control": CACHE_CONTROL,
+        }
+        if_none_match = request_headers.get("if-none-match")
+        range_header = request_headers.get("range")
+        if if_none_match and _etag_matches(if_none_match, self.etag):
+            self.status_code = 304
+            self.ranges = []
+        elif range_header and self._if_range_ok(request_headers.get("if-range")):
+            ranges = parse_ranges(range_header, self.size)
+            if ranges == []:
+                self.status_code = 416
+                self.ranges = []
+                headers["content-range"] = f"bytes */{self.size}"
+            elif ranges:
+                self.status_code = 206
+                self.ranges = ranges
+
+        if self.status_code == 206 and len(self.ranges) == 1:
+            start, end = self.ranges[0]
+            headers["content-range"] = f"bytes {start}-{end - 1}/{self.size}"
+            headers["content-length"] = str(end - start)
+            headers["content-type"] = self.media_type
+        elif self.status_code == 206:
+            self.boundary = secrets.token_hex(12)
+            headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            headers["content-length"] = str(
+                sum(len(self._part_header(s, e)) + (e - s) for s, e in self.ranges) + len(self._closing())
+            )
+        elif self.status_code == 200:
+            headers["content-length"] = str(self.size)
+            headers["content-type"] = self.media_type
+        elif self.status_code == 416:
+            headers["content-length"] = "0"
+        self.init_headers(headers)
+
+    def _if_range_ok(self, if_range: str | None) -> bool:
+        """If-Range: диапазон применяем только если представление не изменилось."""
+        if not if_range:
+            return True
+        if if_range.startswith('"'):
+            return if_range == self.etag  # только сильное сравнение
+        try:
+            return int(parsedate_to_datetime(if_range).timestamp()) >= int(self.st.st_mtime)
+        except (TypeError, ValueError):
+            return False
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"\r\n--{self.boundary}\r\n"
+            f"Content-Type: {self.media_type}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{self.size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.ranges:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        multipart = bool(self.boundary)
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            for start, end in self.ranges:
+                if multipart:
+                    await send({"type": "http.response.body", "body": self._part_header(start, end), "more_body": True})
+                if zerocopy:
+                    await send(
+                        {
+                            "type": "http.response.zerocopysend",
+                            "file": file.wrapped.fileno(),
+                            "offset": start,
+                            "count": end - start,
+                            "more_body": True,
+                        }
+                    )
+                    continue
+                await file.seek(start)
+                offset = start
+                while offset < end:
+                    chunk = await file.read(min(CHUNK_SIZE, end - offset))
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": self._closing() if multipart else b"", "more_body": False})
+
+
+def _upload_path(web_path: str) -> str:
+    return os.path.join(settings.uploads_dir, os.path.basename(web_path))
+
+
+@router.api_route("/podcasts/{podcast_id}/audio/{filename}", methods=["GET", "HEAD"])
+def podcast_audio(podcast_id: int, filename: str, request: Request, db: Session = Depends(get_db)):
+    """Полный выпуск — только при наличии доступа; превью — любому авторизованному пользователю."""
+    tg_id = request.session.get("telegram_id")
+    podcast = catalog.get_podcast(db, podcast_id) if tg_id else None
+    if not podcast:
+        return PlainTextResponse("not found", status_code=404)
+
+    web_path = None
+    if podcast.audio_preview_path and os.path.basename(podcast.audio_preview_path) == filename:
+        web_path = podcast.audio_preview_path
+    elif podcast.audio_full_path and os.path.basename(podcast.audio_full_path) == filename:
+        access = entitlements.get_access(db, str(tg_id), request.session.get("user_id"))
+        if not access or not access.can_listen(podcast.id, podcast.is_free):
+            return PlainTextResponse("forbidden", status_code=403)
+        web_path = podcast.audio_full_path
+    if not web_path:
+        return PlainTextResponse("not found", status_code=404)
+
+    path = _upload_path(web_path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return PlainTextResponse("not found", status_code=404)
+    if not stat.S_ISREG(st.st_mode):
+        return PlainTextResponse("not found", status_code=404)
+
+    if settings.media_x_accel_prefix:
+        # nginx сам обработает Range/If-* и отдаст файл через sendfile
+        return Response(
+            headers={
+                "X-Accel-Redirect": settings.media_x_accel_prefix.rstrip("/") + "/" + os.path.basename(path),
+                "Cache-Control": CACHE_CONTROL,
+            }
+        )
+    return RangeFileResponse(path, st, request.headers)
@@ -0,0 +1,222 @@
+"""
+Очередь фоновой обработки загрузок (таблица media_jobs) и пул процессов-воркеров.
+
+Админка только сохраняет файл и ставит задачу; диспетчер (периодическая задача
+приложения или tools/media_worker.py) забирает задачи, отдаёт файловую работу
+в ProcessPoolExecutor и записывает результат в Podcast.
+"""
+import logging
+import contextlib
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as JobTimeout
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal
+from . import audio, catalog, images, models
+
+
+logger = logging.getLogger("app.media_jobs")
+
+MAX_ATTEMPTS = 3
+# задача в статусе running дольше этого времени считается брошенной (воркер упал)
+STALE_AFTER = timedelta(minutes=30)
+
+_executor: ProcessPoolExecutor | None = None
+# воркеры пула присылают сюда свой pid (initializer), чтобы зависший можно было завершить
+_worker_pids = None
+
+
+def enqueue(db: Session, podcast_id: int, source_path: str, kind: str = "audio") -> models.MediaJob:
+    """Поставить задачу. Коммит — на вызывающей стороне."""
+    job = models.MediaJob(podcast_id=podcast_id, kind=kind, source_path=source_path, status="queued")
+    db.add(job)
+    return job
+
+
+def latest_job(db: Session, podcast_id: int, kind: str = "audio") -> models.MediaJob | None:
+    return (
+        db.query(models.MediaJob)
+        .filter(models.MediaJob.podcast_id == podcast_id, models.MediaJob.kind == kind)
+        .order_by(models.MediaJob.id.desc())
+        .first()
+    )
+
+
+def _fs_path(web_path: str) -> str:
+    return os.path.join(settings.uploads_dir, os.path.basename(web_path))
+
+
+def _claim(db: Session, limit: int) -> list[models.MediaJob]:
+    """Забрать до limit задач; UPDATE ... WHERE status=<прочитанный> не даёт двум диспетчерам взять одну задачу."""
+    job = models.MediaJob
+    stale_before = datetime.utcnow() - STALE_AFTER
+    candidates = (
+        db.query(job.id, job.status)
+        .filter(
+            or_(job.status == "queued", (job.status == "running") & (job.started_at < stale_before)),
+            job.attempts < MAX_ATTEMPTS,
+        )
+        .order_by(job.id.asc())
+        .limit(limit)
+        .all()
+    )
+    claimed = []
+    for job_id, status in candidates:
+        result = db.execute(
+            update(job)
+            .where(job.id == job_id, job.status == status)
+            .values(status="running", started_at=datetime.utcnow(), attempts=job.attempts + 1)
+        )
+        if result.rowcount:
+            claimed.append(job_id)
+    db.commit()
+    return db.query(job).filter(job.id.in_(claimed)).order_by(job.id.asc()).all() if claimed else []
+
+
+def _register_worker(pids) -> None:
+    pids.put(os.getpid())
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _worker_pids
+    if _executor is None:
+        # spawn: воркеры не наследуют пулы соединений и потоки uvicorn
+        context = multiprocessing.get_context("spawn")
+        _worker_pids = context.SimpleQueue()
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, settings.media_workers),
+            mp_context=context,
+            initializer=_register_worker,
+            initargs=(_worker_pids,),
+        )
+    return _executor
+
+
+def _reset_executor() -> None:
+    """
+    Выбросить пул: он сломан (воркер убит — segfault в декодере, OOM) или завис на задаче.
+    Следующий _get_executor() создаст новый.
+    """
+    global _executor, _worker_pids
+    executor, pids, _executor, _worker_pids = _executor, _worker_pids, None, None
+    if executor is None:
+        return
+    executor.shutdown(wait=False, cancel_futures=True)
+    # shutdown() не прерывает работающий воркер, зависший процесс надо завершить явно
+    while not pids.empty():
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.kill(pids.get(), signal.SIGTERM)
+    pids.close()
+
+
+def _submit_batch(jobs: list[models.MediaJob]) -> list:
+    try:
+        executor = _get_executor()
+        return [(job, _submit(executor, job)) for job in jobs]
+    except BrokenProcessPool:
+        # пул сломался между пачками (воркер убит, пока простаивал)
+        _reset_executor()
+        executor = _get_executor()
+        return [(job, _submit(executor, job)) for job in jobs]
+
+
+def _web_path(fs_path: str) -> str:
+    return f"/{settings.uploads_dir}/{os.path.basename(fs_path)}"
+
+
+def _cover_widths() -> list[int]:
+    return [int(w) for w in settings.cover_widths.split(",") if w.strip().isdigit()]
+
+
+def _submit(executor: ProcessPoolExecutor, job: models.MediaJob):
+    src = _fs_path(job.source_path)
+    if job.kind == "cover":
+        return executor.submit(images.process_cover, src, _cover_widths(), settings.cover_quality)
+    preview = os.path.join(os.path.dirname(src), f"preview_{os.path.basename(src)}")
+    return executor.submit(audio.process_audio, src, preview, settings.preview_seconds)
+
+
+def _apply_audio(db: Session, job: models.MediaJob, result: dict) -> None:
+    job.duration_seconds = result["duration_seconds"]
+    podcast = db.get(models.Podcast, job.podcast_id)
+    # файл могли заменить, пока задача была в очереди — тогда результат устарел
+    if podcast and podcast.audio_full_path == job.source_path:
+        podcast.duration_seconds = result["duration_seconds"]
+        podcast.bitrate_kbps = result["bitrate_kbps"]
+        if result["preview_path"]:
+            podcast.audio_preview_path = _web_path(result["preview_path"])
+
+
+def _apply_cover(db: Session, job: models.MediaJob, variants: list[dict]) -> None:
+    podcast = db.get(models.Podcast, job.podcast_id)
+    if not podcast or podcast.cover_path != job.source_path:
+        return
+    new_paths = {_web_path(v["path"]) for v in variants}
+    old = db.query(models.CoverVariant).filter(models.CoverVariant.podcast_id == podcast.id).all()
+    for variant in old:
+        if variant.path not in new_paths:
+            _remove_upload(variant.path)
+        db.delete(variant)
+    db.add_all(
+        models.CoverVariant(
+            podcast_id=podcast.id, format=v["format"], width=v["width"], height=v["height"], path=_web_path(v["path"])
+        )
+        for v in variants
+    )
+
+
+def _remove_upload(web_path: str | None) -> None:
+    if web_path:
+        try:
+            os.remove(_fs_path(web_path))
+        except OSError:
+            pass
+
+
+def dispatch() -> int:
+    """Обработать одну пачку задач. Возвращает число завершённых задач."""
+    db = SessionLocal()
+    try:
+        jobs = _claim(db, max(1, settings.media_workers))
+        if not jobs:
+            return 0
+        futures = _submit_batch(jobs)
+        # пачка не больше числа воркеров, задачи идут параллельно — один срок на всю пачку
+        deadline = time.monotonic() + settings.media_job_timeout_seconds
+        for job, future in futures:
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                if job.kind == "cover":
+                    _apply_cover(db, job, result)
+                else:
+                    _apply_audio(db, job, result)
+                job.status = "done"
+                job.error = None
+            except Exception as e:
+                if isinstance(e, (BrokenProcessPool, JobTimeout)):
+                    # остальные задачи пачки в этом пуле тоже прервутся и уйдут на повтор
+                    _reset_executor()
+                logger.warning("media job %s failed (attempt %s): %r", job.id, job.attempts, e)
+                job.status = "error" if job.attempts >= MAX_ATTEMPTS else "queued"
+                job.error = repr(e)[:2000]
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        catalog.bump()
+        return len(jobs)
+    finally:
+        db.close()
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,245 @@
+"""
+Метрики процесса в текстовом формате Prometheus: GET /metrics (админ-сессия или METRICS_TOKEN).
+
+Запросы: гистограмма времени по шаблону маршрута (/podcasts/{podcast_id}, а не каждый id),
+ответы по статусам, запросы в работе. SQL: число и время запросов через события engine.
+Плюс очередь threadpool и hit ratio in-process кэшей.
+
+Запись почти без блокировок: каждый поток пишет в свой шард, /metrics складывает шарды;
+общая блокировка берётся только при появлении нового потока и при выдаче.
+"""
+import bisect
+import hmac
+import threading
+import time
+from collections import defaultdict
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .auth import is_authenticated
+from .config import settings
+from . import catalog, entitlements, telegram_utils, templating
+
+
+router = APIRouter()
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class _Sharded:
+    """Потоколокальные словари label-кортеж -> значение; шард потока создаётся при первой записи."""
+
+    _registry_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._shards: list[dict] = []
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._registry_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self) -> list[dict]:
+        with self._registry_lock:
+            # копии: поток может добавить ключ, пока мы итерируемся
+            return [dict(shard) for shard in self._shards]
+
+
+class Counter(_Sharded):
+    def inc(self, labels: tuple, value: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + value
+
+    def collect(self) -> dict[tuple, float]:
+        total: dict[tuple, float] = defaultdict(float)
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                total[labels] += value
+        return total
+
+
+class Histogram(_Sharded):
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        super().__init__()
+        self.buckets = buckets
+
+    def observe(self, labels: tuple, value: float) -> None:
+        shard = self._shard()
+        slot = shard.get(labels)
+        if slot is None:
+            # [счётчики корзин (последняя — +Inf), count, sum]
+            slot = shard[labels] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+        slot[0][bisect.bisect_left(self.buckets, value)] += 1
+        slot[1] += 1
+        slot[2] += value
+
+    def collect(self) -> dict[tuple, list]:
+        total: dict[tuple, list] = {}
+        for shard in self._snapshot():
+            for labels, (counts, count, sum_) in shard.items():
+                acc = total.setdefault(labels, [[0] * (len(self.buckets) + 1), 0, 0.0])
+                acc[0] = [a + b for a, b in zip(acc[0], counts)]
+                acc[1] += count
+                acc[2] += sum_
+        return total
+
+
+http_duration = Histogram(HTTP_BUCKETS)
+http_responses = Counter()
+sql_duration = Histogram(SQL_BUCKETS)
+_in_flight = [0]  # меняется только в event loop
+
+
+def route_template(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+def request_started() -> None:
+    _in_flight[0] += 1
+
+
+def request_finished(request: Request, status: int, seconds: float) -> None:
+    _in_flight[0] -= 1
+    route = route_template(request)
+    http_duration.observe((request.method, route), seconds)
+    http_responses.inc((route, str(status)))
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip()[:8].split(None, 1)
+    kind = head[0].upper() if head else ""
+    return kind if kind in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # старт храним на контексте выполнения, а не стеком в conn.info: если запрос упадёт,
+    # after_cursor_execute не вызовется, и стек рос бы и сдвигал замеры следующих запросов
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        sql_duration.observe((_statement_kind(statement),), time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Время каждого SQL-запроса по типу (SELECT/INSERT/...). Повторный вызов ничего не меняет."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _histogram_lines(out: list, name: str, help_: str, hist: Histogram, names: tuple[str, ...]) -> None:
+    out += [f"# HELP {name} {help_}", f"# TYPE {name} histogram"]
+    for labels, (counts, count, sum_) in sorted(hist.collect().items()):
+        cumulative = 0
+        for bound, n in zip(hist.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            out.append(f"{name}_bucket{_labels(names + ('le',), labels + (le,))} {cumulative}")
+        out.append(f"{name}_count{_labels(names, labels)} {count}")
+        out.append(f"{name}_sum{_labels(names, labels)} {sum_:.6f}")
+
+
+def _threadpool_lines(out: list) -> None:
+    try:
+        from anyio.to_thread import current_default_thread_limiter
+
+        limiter = current_default_thread_limiter()
+        waiting = limiter.statistics().tasks_waiting
+    except Exception:  # вне event loop или другая версия anyio
+        return
+    out += [
+        "# HELP threadpool_busy_threads Worker threads running sync endpoints and jobs.",
+        "# TYPE threadpool_busy_threads gauge",
+        f"threadpool_busy_threads {limiter.borrowed_tokens}",
+        "# HELP threadpool_max_threads Threadpool capacity.",
+        "# TYPE threadpool_max_threads gauge",
+        f"threadpool_max_threads {limiter.total_tokens}",
+        "# HELP threadpool_queue_depth Calls waiting for a free worker thread.",
+        "# TYPE threadpool_queue_depth gauge",
+        f"threadpool_queue_depth {waiting}",
+    ]
+
+
+def _cache_lines(out: list) -> None:
+    caches = {
+        "entitlements": entitlements.cache_stats(),
+        "catalog": catalog.cache_stats(),
+        "telegram_init_data": telegram_utils.cache_stats(),
+        "template_fragments": templating.fragment_cache_stats(),
+    }
+    for metric, kind, help_ in (
+        ("app_cache_hits_total", "counter", "In-process cache hits."),
+        ("app_cache_misses_total", "counter", "In-process cache misses."),
+        ("app_cache_hit_ratio", "gauge", "hits / (hits + misses) since start."),
+        ("app_cache_size", "gauge", "Entries currently cached."),
+    ):
+        out += [f"# HELP {metric} {help_}", f"# TYPE {metric} {kind}"]
+        for cache, st in caches.items():
+            hits, misses = st.get("hits", 0), st.get("misses", 0)
+            value = {
+                "app_cache_hits_total": hits,
+                "app_cache_misses_total": misses,
+                "app_cache_hit_ratio": round(hits / (hits + misses), 6) if hits + misses else 0,
+                "app_cache_size": st.get("size"),
+            }[metric]
+            if value is not None:
+                out.append(f'{metric}{{cache="{cache}"}} {value}')
+    out += [
+        "# HELP catalog_version Catalog snapshot version (bumped on admin edits).",
+        "# TYPE catalog_version gauge",
+        f"catalog_version {caches['catalog'].get('version', 0)}",
+    ]
+
+
+def render() -> str:
+    out: list[str] = []
+    _histogram_lines(out, "http_request_duration_seconds", "Request latency by route template.", http_duration, ("method", "route"))
+    out += ["# HELP http_responses_total Responses by route template and status.", "# TYPE http_responses_total counter"]
+    for labels, value in sorted(http_responses.collect().items()):
+        out.append(f"http_responses_total{_labels(('route', 'status'), labels)} {int(value)}")
+    out += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {_in_flight[0]}",
+    ]
+    _threadpool_lines(out)
+    _histogram_lines(out, "db_query_duration_seconds", "SQL statement time by kind.", sql_duration, ("kind",))
+    _cache_lines(out)
+    return "\n".join(out) + "\n"
+
+
+def _allowed(request: Request) -> bool:
+    if is_authenticated(request):
+        return True
+    token = settings.metrics_token
+    header = request.headers.get("authorization", "")
+    return bool(token) and hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if not _allowed(request):
+        return PlainTextResponse("forbidden\n", status_code=403)
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -18,6 +18,8 @@ class ProjectCard(Base):
 
 class Podcast(Base):
     __tablename__ = "podcasts"
+    # keyset pagination in admin lists
+    __table_args__ = (Index("ix_podcasts_published_at_id", "published_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
@@ -30,10 +32,16 @@ class Podcast(Base):
     audio_full_path = Column(String(500), nullable=True)
     is_published = Column(Boolean, default=False)
     is_free = Column(Boolean, default=False)
+    # filled in by the media job together with duration_seconds
+    bitrate_kbps = Column(Integer, nullable=True)
+
+    # admin read paths load it explicitly (joinedload); lazy access would be a query per row
+    price = relationship("PodcastPrice", uselist=False, viewonly=True, lazy="raise")
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(String(64), unique=True, index=True, nullable=False)
@@ -46,12 +54,27 @@ class User(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_created_at_id", "created_at", "id"),
+        Index("ix_transactions_status_created_at", "status", "created_at"),
+        Index("ix_transactions_user_id_status", "user_id", "status"),
+        # one pending order per user and item (podcast_id NULL = subscription): checkout relies on it
+        Index(
+            "uq_transactions_pending_item",
+            "user_id",
+            "type",
+            text("coalesce(podcast_id, 0)"),
+            unique=True,
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     type = Column(String(50), nullable=False)  # 'single' or 'subscription'
     podcast_id = Column(Integer, ForeignKey("podcasts.id"), nullable=True)
-    status = Column(String(50), default="success")  # 'success' / 'error'
+    status = Column(String(50), default="success")  # 'success' / 'error' / 'refunded' / 'pending' / 'expired'
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
@@ -74,3 +97,103 @@ class AppConfig(Base):
     id = Column(Integer, primary_key=True)
     subscription_price_cents = Column(Integer, default=0, nullable=False)
 
+
+
+# Materialized access rights: one row per purchased podcast (or subscription marker).
+# Filled by the payment webhook, see app/entitlements.py and tools/backfill_entitlements.py
+class UserEntitlement(Base):
+    __tablename__ = "user_entitlements"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # podcast id for single purchases, SUBSCRIPTION_MARKER (0) for subscription
+    podcast_id = Column(Integer, primary_key=True, autoincrement=False)
+    granted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Single-row counters for the admin dashboard, maintained by the write paths
+# and periodically reconciled (app/stats.py)
+class StatsCounters(Base):
+    __tablename__ = "stats_counters"
+
+    id = Column(Integer, primary_key=True)
+    podcasts = Column(Integer, default=0, nullable=False)
+    published = Column(Integer, default=0, nullable=False)
+    users = Column(Integer, default=0, nullable=False)
+    subscriptions = Column(Integer, default=0, nullable=False)
+    transactions = Column(Integer, default=0, nullable=False)
+    success_tx = Column(Integer, default=0, nullable=False)
+    reconciled_at = Column(DateTime, nullable=True)
+
+
+# Background processing of uploaded media (app/media_jobs.py)
+class MediaJob(Base):
+    __tablename__ = "media_jobs"
+    __table_args__ = (Index("ix_media_jobs_status_id", "status", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    podcast_id = Column(Integer, ForeignKey("podcasts.id"), nullable=False, index=True)
+    kind = Column(String(20), default="audio", nullable=False)  # 'audio' / 'cover'
+    source_path = Column(String(500), nullable=False)
+    status = Column(String(20), default="queued", nullable=False)  # queued / running / done / error
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    # results
+    duration_seconds = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+# Resized cover derivatives for srcset, produced by the 'cover' media job
+class CoverVariant(Base):
+    __tablename__ = "cover_variants"
+
+    id = Column(Integer, primary_key=True)
+    podcast_id = Column(Integer, ForeignKey("podcasts.id"), nullable=False, index=True)
+    format = Column(String(10), nullable=False)  # 'webp' / 'avif'
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    path = Column(String(500), nullable=False)
+
+
+# Raw Payform notifications; the webhook only stores them, a background consumer applies them
+class PaymentEvent(Base):
+    __tablename__ = "payment_events"
+    __table_args__ = (
+        UniqueConstraint("order_id", "status", name="uq_payment_events_order_status"),
+        Index("ix_payment_events_processed_at_id", "processed_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(String(64), nullable=False)
+    status = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON as received
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+
+
+# Old expired checkout attempts moved out of transactions by the reaper (app/transactions.py)
+class TransactionArchive(Base):
+    __tablename__ = "transactions_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    type = Column(String(50), nullable=False)
+    podcast_id = Column(Integer, nullable=True)
+    status = Column(String(50), nullable=False)
+    created_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+# Cross-process cache invalidation log: one worker publishes, the others replay it (app/invalidation.py)
+class CacheInvalidation(Base):
+    __tablename__ = "cache_invalidations"
+    # without AUTOINCREMENT SQLite may reuse ids after pruning, and readers would skip new rows
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(32), nullable=False)  # 'access' / 'catalog'
+    key = Column(String(64), nullable=True)  # telegram_id for 'access'; NULL = whole scope
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,64 @@
+"""
+Keyset-пагинация для админских списков.
+
+Страница выбирается условием (ts, id) < (cursor_ts, cursor_id) по индексу (ts, id),
+поэтому время ответа не зависит от глубины листания (в отличие от OFFSET).
+"""
+from datetime import datetime
+from typing import Any
+from urllib.parse import urlencode
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(ts: datetime | None, row_id: int) -> str:
+    return f"{ts.isoformat() if ts else ''}_{row_id}"
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    if not cursor:
+        return None
+    try:
+        ts_part, id_part = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts_part), int(id_part)
+    except ValueError:
+        return None
+
+
+def clamp_limit(limit: int | None) -> int:
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(limit or DEFAULT_PAGE_SIZE)))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def keyset_page(query: Query, ts_col, id_col, cursor: str | None, limit: int) -> tuple[list[Any], str | None]:
+    """
+    Страница по убыванию (ts_col, id_col), начиная после cursor.
+    Возвращает (rows, next_cursor); next_cursor=None на последней странице.
+    Строки с NULL в ts_col в выборку не попадают, у всех таблиц там default.
+    """
+    after = decode_cursor(cursor)
+    if after:
+        query = query.filter(tuple_(ts_col, id_col) < tuple_(*after))
+    rows = query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
+
+
+def page_url(path: str, filters: dict, cursor: str | None = None, limit: int | None = None) -> str:
+    """Ссылка на страницу с сохранением активных фильтров."""
+    params = {k: v for k, v in filters.items() if v not in (None, "")}
+    if limit and limit != DEFAULT_PAGE_SIZE:
+        params["limit"] = limit
+    if cursor:
+        params["after"] = cursor
+    return f"{path}?{urlencode(params)}" if params else path
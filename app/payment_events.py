@@ -0,0 +1,202 @@
+"""
+Входящие уведомления Payform (таблица payment_events).
+
+Webhook только проверяет подпись и записывает событие — повторы провайдера с тем же
+(order_id, status) схлопываются уникальным ключом. Периодическая задача apply_pending()
+применяет события пачками: статус транзакции, права доступа, счётчики дашборда.
+Отказ или возврат после success отзывает выданное право, если у пользователя нет
+другой успешной оплаты того же товара.
+"""
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal, dialect_insert
+from . import entitlements, models, stats, transactions
+
+
+logger = logging.getLogger("app.payments")
+
+MAX_ATTEMPTS = 5
+SUCCESS_STATUSES = {"paid", "success", "succeeded"}
+FAILED_STATUSES = {"failed", "error", "canceled", "cancelled"}
+REFUNDED_STATUSES = {"refunded", "refund"}
+
+
+def store(db: Session, order_id: str, status: str, payload: dict[str, Any]) -> bool:
+    """Записать событие (идемпотентно). True — новое, False — повтор уже принятого."""
+    stmt = (
+        dialect_insert(db, models.PaymentEvent.__table__)
+        .values(
+            order_id=order_id,
+            status=status,
+            payload=json.dumps(payload, ensure_ascii=False, default=str),
+            received_at=datetime.utcnow(),
+            attempts=0,
+        )
+        .on_conflict_do_nothing(index_elements=["order_id", "status"])
+    )
+    result = db.execute(stmt)
+    db.commit()
+    return bool(result.rowcount)
+
+
+def _txn_id(order_id: str) -> int | None:
+    if not order_id.startswith("txn-"):
+        return None
+    try:
+        return int(order_id.split("-", 1)[1])
+    except ValueError:
+        return None
+
+
+def _apply_status(
+    txn: models.Transaction, user: models.User | None, status: str, deltas: Counter, grants: list, revokes: list
+) -> str | None:
+    """
+    Применить статус к транзакции. Изменения счётчиков копятся в deltas, выдаваемые
+    права — в grants, кандидаты на отзыв — в revokes. Возвращает telegram_id, чей кэш доступа надо сбросить.
+    """
+    was_success = txn.status == "success"
+    if status in SUCCESS_STATUSES:
+        txn.status = "success"
+        if not was_success:
+            deltas["success_tx"] += 1
+        if txn.type == "subscription":
+            if user and not user.has_subscription:
+                user.has_subscription = True
+                deltas["subscriptions"] += 1
+            grants.append((txn.user_id, None))
+        elif txn.podcast_id:
+            grants.append((txn.user_id, txn.podcast_id))
+        return user.telegram_id if user else None
+    if status in FAILED_STATUSES or status in REFUNDED_STATUSES:
+        txn.status = "refunded" if status in REFUNDED_STATUSES else "error"
+        if was_success:
+            deltas["success_tx"] -= 1
+            revokes.append((txn.user_id, None if txn.type == "subscription" else txn.podcast_id))
+            return user.telegram_id if user else None
+    return None
+
+
+def _revoke(db: Session, revokes: list, users: dict, deltas: Counter) -> None:
+    """Отозвать права отменённых оплат, если у пользователя не осталось другой успешной оплаты того же."""
+    if not revokes:
+        return
+    db.flush()  # статусы пачки должны быть видны проверке ниже
+    txn = models.Transaction
+    for user_id, podcast_id in set(revokes):
+        if podcast_id is None:
+            item = txn.type == "subscription"
+        else:
+            item = (txn.type == "single") & (txn.podcast_id == podcast_id)
+        if db.query(txn.id).filter(txn.user_id == user_id, txn.status == "success", item).first():
+            continue
+        entitlements.revoke(db, user_id, podcast_id)
+        user = users.get(user_id)
+        if podcast_id is None and user and user.has_subscription:
+            user.has_subscription = False
+            deltas["subscriptions"] -= 1
+
+
+def _apply_batch(db: Session, rows: list) -> tuple[int, set[str]]:
+    """
+    Применить пачку событий в одной транзакции (коммит — на вызывающей стороне).
+    Событие сначала забирается UPDATE ... WHERE processed_at IS NULL — второй обработчик его пропустит.
+    """
+    event = models.PaymentEvent
+    claimed = set(
+        db.execute(
+            update(event)
+            .where(event.id.in_([row.id for row in rows]), event.processed_at.is_(None))
+            .values(processed_at=datetime.utcnow(), attempts=event.attempts + 1, error=None)
+            .returning(event.id)
+            .execution_options(synchronize_session=False)
+        ).scalars()
+    )
+    rows = [row for row in rows if row.id in claimed]  # остальные успел забрать другой обработчик
+    # транзакции и пользователи пачки — двумя запросами вместо двух на событие
+    txn_ids = {txn_id for txn_id in (_txn_id(row.order_id) for row in rows) if txn_id is not None}
+    txns = {t.id: t for t in db.query(models.Transaction).filter(models.Transaction.id.in_(txn_ids))} if txn_ids else {}
+    # заказ мог уйти в архив как expired, а оплата пришла позже — возвращаем строку, иначе платёж потеряется
+    paid_ids = {_txn_id(row.order_id) for row in rows if row.status in SUCCESS_STATUSES}
+    txns.update((t.id, t) for t in transactions.restore_archived(db, (paid_ids & txn_ids) - txns.keys()))
+    user_ids = {t.user_id for t in txns.values()}
+    users = {u.id: u for u in db.query(models.User).filter(models.User.id.in_(user_ids))} if user_ids else {}
+
+    touched, deltas, grants, revokes = set(), Counter(), [], []
+    for row in rows:
+        txn = txns.get(_txn_id(row.order_id))
+        if txn is None:
+            logger.warning("payment event for unknown order %s (status %s) ignored", row.order_id, row.status)
+            continue
+        telegram_id = _apply_status(txn, users.get(txn.user_id), row.status, deltas, grants, revokes)
+        if telegram_id:
+            touched.add(telegram_id)
+    entitlements.grant_many(db, grants)
+    # после выдачи: в одной пачке success и следующий за ним возврат должны закончиться отзывом
+    _revoke(db, revokes, users, deltas)
+    stats.bump(db, **deltas)
+    return len(claimed), touched
+
+
+def _record_failure(db: Session, event_id: int, exc: Exception) -> None:
+    row = db.get(models.PaymentEvent, event_id)
+    if row is None:
+        return
+    row.attempts = (row.attempts or 0) + 1
+    row.error = repr(exc)[:2000]
+    if row.attempts >= MAX_ATTEMPTS:
+        row.processed_at = datetime.utcnow()  # больше не пытаемся, остаётся с error
+    db.commit()
+    logger.warning("payment event %s failed (attempt %s): %r", event_id, row.attempts, exc)
+
+
+def apply_pending(limit: int | None = None) -> int:
+    """Применить необработанные события пачками по limit, пачка — одна транзакция. Возвращает число применённых."""
+    limit = limit or settings.payment_events_batch_size
+    event = models.PaymentEvent
+    total = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(
+                select(event.id, event.order_id, event.status)
+                .where(event.processed_at.is_(None), event.attempts < MAX_ATTEMPTS)
+                .order_by(event.id.asc())
+                .limit(limit)
+            ).all()
+            if not rows:
+                return total
+            try:
+                applied, touched = _apply_batch(db, rows)
+                db.commit()
+            except Exception:
+                # одно плохое событие не должно держать пачку: повторяем по одному
+                db.rollback()
+                applied, touched, failed_orders = 0, set(), set()
+                for row in rows:
+                    if row.order_id in failed_orders:
+                        continue  # сохраняем порядок статусов заказа: ждём повтора предыдущего события
+                    try:
+                        one, one_touched = _apply_batch(db, [row])
+                        db.commit()
+                        applied += one
+                        touched |= one_touched
+                    except Exception as exc:
+                        db.rollback()
+                        _record_failure(db, row.id, exc)
+                        failed_orders.add(row.order_id)
+            db.expunge_all()
+            entitlements.invalidate(*touched)
+            total += applied
+            if len(rows) < limit:
+                return total
+    finally:
+        db.close()
@@ -1,21 +1,38 @@
 import hashlib
 import hmac
+import json
 import logging
 from typing import Any, Dict, List, Tuple
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import JSONResponse, RedirectResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from .config import settings
 from .database import get_db
-from . import models
+from .cache import TTLCache
+from . import catalog, entitlements, payment_events, transactions
 
 
 router = APIRouter(prefix="/api/payments", tags=["payments"])
 logger = logging.getLogger("app.payments")
 
 
+# Подписанные ссылки для повторно используемых pending-транзакций
+_link_cache = TTLCache(maxsize=settings.user_cache_size, ttl=max(1, settings.pending_reuse_seconds))
+
+
+def cached_payform_link(data: Dict[str, Any]) -> str:
+    """build_payform_link() с кэшем по содержимому платежа (тот же заказ, цена, телефон)."""
+    key = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    link = _link_cache.get(key)
+    if link is None:
+        link = build_payform_link(data)
+        _link_cache.set(key, link)
+    return link
+
+
 def build_payform_link(data: Dict[str, Any]) -> str:
     """
     Строим ссылку на оплату по документации Продамуса.
@@ -33,7 +50,7 @@ def build_payform_link(data: Dict[str, Any]) -> str:
     # Добавляем опциональные параметры если есть
     if data.get("customer_phone"):
         payload["customer_phone"] = data["customer_phone"]
-        logger.info("payform.customer_phone: %s", data["customer_phone"])
+        logger.debug("payform.customer_phone: %s", data["customer_phone"])
     if data.get("customer_email"):
         payload["customer_email"] = data["customer_email"]
     if data.get("customer_extra"):
@@ -51,7 +68,7 @@ def build_payform_link(data: Dict[str, Any]) -> str:
     if settings.payform_secret:
         signature = create_signature(payload, settings.payform_secret)
         payload["signature"] = signature
-        logger.info("payform.signature: %s", signature)
+        logger.debug("payform.signature: %s", signature)
     
     # Строим query string (простой способ без URL-кодирования)
     # Сначала добавляем параметры в правильном порядке
@@ -80,7 +97,7 @@ def build_payform_link(data: Dict[str, Any]) -> str:
     query = "&".join(query_parts)
     link = f"{base}?{query}"
     
-    logger.info("payform.link: %s", link)
+    logger.debug("payform.link: %s", link)
     return link
 
 
@@ -93,7 +110,7 @@ def create_signature(payload: Dict[str, Any], secret_key: str) -> str:
     sign_data = {k: v for k, v in payload.items() if k != "signature"}
     
     # Логируем что именно подписываем
-    logger.info("payform.sign.keys: %s", list(sign_data.keys()))
+    logger.debug("payform.sign.keys: %s", list(sign_data.keys()))
     
     # Создаем плоский словарь для точного соответствия PHP http_build_query
     flat_data = {}
@@ -127,7 +144,7 @@ def create_signature(payload: Dict[str, Any], secret_key: str) -> str:
         sign_parts.append(f"{key}={value}")
     
     sign_string = "&".join(sign_parts)
-    logger.info("payform.sign_string: %s", sign_string)
+    logger.debug("payform.sign_string: %s", sign_string)
     
     # HMAC-SHA256
     signature = hmac.new(
@@ -156,34 +173,30 @@ async def create_payment_link(
     tariff = body.get("tariff")
     podcast_id = body.get("podcast_id")
 
-    user = db.query(models.User).filter(models.User.telegram_id == str(request.session.get("telegram_id"))).first()
+    user = entitlements.get_access(db, str(request.session.get("telegram_id")), request.session.get("user_id"))
     if not user:
         raise HTTPException(status_code=400, detail="user_not_found")
 
     # Определяем товар и цену
+    prices = catalog.price_book(db)
     if tariff == "subscription":
-        cfg = db.query(models.AppConfig).first()
-        price_cents = (cfg.subscription_price_cents if cfg else 0) or 0
+        price_cents = prices.subscription_cents
         name = "Подписка"
     elif tariff == "single" and podcast_id:
-        pp = db.query(models.PodcastPrice).filter(models.PodcastPrice.podcast_id == int(podcast_id)).first()
-        podcast = db.get(models.Podcast, int(podcast_id))
-        price_cents = (pp.price_cents if pp else 0) or 0
+        podcast = catalog.get_podcast(db, int(podcast_id))
+        price_cents = prices.podcast_price(int(podcast_id))
         name = f"Подкаст:{podcast.title if podcast else podcast_id}".replace(" ", "_")
-        logger.info("payform.name: %s", name)
+        logger.debug("payform.name: %s", name)
     else:
         raise HTTPException(status_code=400, detail="bad_tariff")
 
-    # Создаем транзакцию
-    txn = models.Transaction(
-        user_id=user.id,
-        type="subscription" if tariff == "subscription" else "single",
-        podcast_id=int(podcast_id) if tariff == "single" and podcast_id else None,
-        status="pending",
+    # Создаем транзакцию (или берём свежую такую же pending)
+    txn = transactions.get_or_create_pending(
+        db,
+        user.user_id,
+        "subscription" if tariff == "subscription" else "single",
+        int(podcast_id) if tariff == "single" and podcast_id else None,
     )
-    db.add(txn)
-    db.commit()
-    db.refresh(txn)
 
     # Строим данные для платежки (как в PHP примере)
     rub_amount = max(0, price_cents // 100)
@@ -208,7 +221,7 @@ async def create_payment_link(
     if settings.payform_sys:
         payment_data["sys"] = settings.payform_sys
 
-    link = build_payform_link(payment_data)
+    link = cached_payform_link(payment_data)
     return JSONResponse({"ok": True, "link": link, "txn_id": txn.id})
 
 
@@ -222,12 +235,12 @@ async def payform_webhook(
     # Пробуем получить JSON, если не получается - form data
     try:
         data = await request.json()
-        logger.info("payform.webhook: received JSON data: %s", data)
+        logger.debug("payform.webhook: received JSON data: %s", data)
     except Exception:
         try:
             form = await request.form()
             data = {k: v for k, v in form.items()}
-            logger.info("payform.webhook: received form data: %s", data)
+            logger.debug("payform.webhook: received form data: %s", data)
         except Exception:
             raise HTTPException(status_code=400, detail="invalid_data")
 
@@ -250,31 +263,12 @@ async def payform_webhook(
         else:
             logger.info("payform.webhook: signature ok order_id=%s", data.get("order_id"))
 
-    # Обрабатываем заказ
-    order_id = data.get("order_id") or data.get("orderId") or ""
+    # Только записываем событие и сразу отвечаем: применяет его payment_events.apply_pending()
+    order_id = str(data.get("order_id") or data.get("orderId") or "")
     status_val = str(data.get("status", "")).lower()
-
-    if not order_id or not order_id.startswith("txn-"):
+    if not order_id.startswith("txn-"):
         return JSONResponse({"ok": True})
 
-    txn_id_str = order_id.split("-", 1)[1]
-    try:
-        txn_id = int(txn_id_str)
-    except Exception:
-        return JSONResponse({"ok": True})
-
-    txn = db.get(models.Transaction, txn_id)
-    if not txn:
-        return JSONResponse({"ok": True})
-
-    if status_val in {"paid", "success", "succeeded"}:
-        txn.status = "success"
-        if txn.type == "subscription":
-            user = db.get(models.User, txn.user_id)
-            if user:
-                user.has_subscription = True
-    elif status_val in {"failed", "error", "canceled", "cancelled"}:
-        txn.status = "error"
-
-    db.commit()
+    if not await run_in_threadpool(payment_events.store, db, order_id, status_val, data):
+        logger.info("payform.webhook: duplicate order_id=%s status=%s", order_id, status_val)
     return JSONResponse({"ok": True})
@@ -5,9 +5,9 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
 from .database import get_db
-from .telegram_utils import validate_init_data
+from .telegram_utils import verify_init_data
 from .config import settings
-from . import models
+from . import users
 
 router = APIRouter(prefix="/api")
 logger = logging.getLogger("app.telegram")
@@ -20,39 +20,23 @@ def telegram_auth(
     db: Session = Depends(get_db),
 ):
     logger = logging.getLogger("app.telegram")
-    ua = request.headers.get("user-agent", "")
-    ref = request.headers.get("referer", "")
-    origin = request.headers.get("origin", "")
-    # Dump all headers for debug
-    try:
-        headers_dump = {k.lower(): v for k, v in request.headers.items()}
-    except Exception:
-        headers_dump = {}
-    logger.info(
-        "telegram_auth called: ua=%s ref=%s origin=%s init_data_len=%s snippet=%s headers=%s",
-        ua,
-        ref,
-        origin,
-        len(init_data or ""),
-        (init_data or "")[:200],
-        headers_dump,
-    )
-
-    parsed = validate_init_data(init_data, bot_token=settings.bot_token)
+    parsed, from_cache = verify_init_data(init_data, bot_token=settings.bot_token)
     if not parsed or "user" not in parsed:
-        logger.warning("telegram_auth validation failed")
+        logger.warning(
+            "telegram_auth validation failed",
+            extra={"init_data_len": len(init_data or ""), "ua": request.headers.get("user-agent", "")},
+        )
         return JSONResponse({"ok": False}, status_code=400)
 
     tg_user = parsed["user"]
     telegram_id = str(tg_user.get("id"))
-    logger.info("telegram_auth success: telegram_id=%s", telegram_id)
-    user = db.query(models.User).filter(models.User.telegram_id == telegram_id).first()
-    if not user:
-        user = models.User(telegram_id=telegram_id)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+    logger.info("telegram_auth success: telegram_id=%s cached=%s", telegram_id, from_cache)
+    # повторный запуск с той же initData в той же сессии: id пользователя уже известен
+    if from_cache and request.session.get("telegram_id") == telegram_id and request.session.get("user_id"):
+        return {"ok": True}
+    user_id, _ = users.upsert(db, telegram_id)
     request.session["telegram_id"] = telegram_id
+    request.session["user_id"] = user_id
     return {"ok": True}
 
 
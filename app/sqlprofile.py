@@ -0,0 +1,177 @@
+"""
+Профилирование SQL по запросам (SQL_PROFILE=1) и бюджеты запросов.
+
+Хуки before/after_cursor_execute считают запросы текущего HTTP-запроса (contextvar
+доходит и до threadpool, где работают sync-эндпоинты): число, суммарное время БД и
+повторы одного и того же SQL. Ответ получает заголовок Server-Timing; медленные запросы
+и запросы с повторяющимся SQL (похоже на N+1) пишутся в лог app.sql как warning.
+
+Бюджет для проверок (работает и без SQL_PROFILE):
+
+    with sqlprofile.query_budget(5, max_repeats=2):
+        client.get("/admin/transactions")
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+
+logger = logging.getLogger("app.sql")
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\([^)]+\)s\s*,)+\s*%\([^)]+\)s\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """SQL без литералов и с раскрытыми IN-списками в одной форме: одинаковые запросы сливаются."""
+    statement = _IN_LIST.sub("(?...)", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class RequestProfile:
+    __slots__ = ("method", "path", "queries", "db_seconds", "fingerprints")
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def repeats(self, threshold: int) -> list[tuple[str, int]]:
+        """Запросы, выполненные не меньше threshold раз, — кандидаты в N+1."""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+    def summary(self, top: int = 5) -> str:
+        lines = [f"{self.method} {self.path}: {self.queries} queries, {self.db_seconds * 1000:.1f} ms in DB"]
+        lines += [f"  {n}x {fp[:300]}" for fp, n in self.fingerprints.most_common(top)]
+        return "\n".join(lines)
+
+
+_current: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar("sql_profile", default=None)
+_budgets: list[list[RequestProfile]] = []  # активные query_budget(): сюда попадают завершённые запросы
+_budgets_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # на контексте выполнения, как в metrics: упавший запрос не оставляет мусора в conn.info
+    if _current.get() is not None and context is not None:
+        context._sql_profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    started = getattr(context, "_sql_profile_started", None)
+    if started is not None:
+        profile.db_seconds += time.perf_counter() - started
+    profile.queries += 1
+    profile.fingerprints[fingerprint(statement)] += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Повесить хуки на engine (один раз). Без активного профиля они ничего не делают."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _report(profile: RequestProfile) -> None:
+    repeats = profile.repeats(settings.sql_profile_repeat)
+    slow = profile.db_seconds * 1000 >= settings.sql_profile_slow_ms
+    too_many = profile.queries > settings.sql_profile_max_queries
+    level = logging.WARNING if repeats or slow or too_many else logging.DEBUG
+    if not logger.isEnabledFor(level):
+        return
+    reasons = [r for r, hit in (("n+1", repeats), ("slow", slow), ("queries", too_many)) if hit]
+    logger.log(
+        level,
+        "sql profile: %s %s -> %s queries, %.1f ms%s",
+        profile.method,
+        profile.path,
+        profile.queries,
+        profile.db_seconds * 1000,
+        f" ({', '.join(reasons)})" if reasons else "",
+        extra={
+            "method": profile.method,
+            "path": profile.path,
+            "queries": profile.queries,
+            "db_ms": round(profile.db_seconds * 1000, 2),
+            "repeats": [{"n": n, "sql": fp[:300]} for fp, n in repeats[:5]],
+        },
+    )
+
+
+class ProfileMiddleware:
+    """
+    Заводит RequestProfile на каждый HTTP-запрос, если включён SQL_PROFILE или активен query_budget().
+    Иначе — прямой проход. В ответ добавляется Server-Timing: db;dur=<мс>;desc="<N> queries".
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (settings.sql_profile or _budgets):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current.set(profile)
+
+        async def tagged_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing", f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries"'
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            _current.reset(token)
+            with _budgets_lock:
+                for captured in _budgets:
+                    captured.append(profile)
+            if settings.sql_profile:
+                _report(profile)
+
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: int | None = None) -> Iterator[list[RequestProfile]]:
+    """
+    Проверить, что каждый HTTP-запрос внутри блока уложился в max_queries SQL-запросов
+    (и ни один SQL не повторился больше max_repeats раз). Иначе AssertionError со сводкой.
+    Фоновые задачи не учитываются: считаются только запросы приложения через ProfileMiddleware.
+    """
+    captured: list[RequestProfile] = []
+    with _budgets_lock:
+        _budgets.append(captured)
+    try:
+        yield captured
+    finally:
+        with _budgets_lock:
+            _budgets.remove(captured)
+    failures = [
+        p for p in captured
+        if p.queries > max_queries or (max_repeats is not None and p.repeats(max_repeats + 1))
+    ]
+    if failures:
+        limits = f"max {max_queries} queries" + (f", max {max_repeats} repeats" if max_repeats is not None else "")
+        raise AssertionError(f"query budget exceeded ({limits}):\n" + "\n".join(p.summary() for p in failures))
@@ -0,0 +1,85 @@
+"""
+Счётчики дашборда (таблица stats_counters, одна строка).
+
+Пути записи меняют счётчики инкрементально через bump() в той же транзакции,
+reconcile() периодически пересчитывает их по таблицам и исправляет дрейф.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, dialect_insert
+from . import models
+
+
+ROW_ID = 1
+COUNTERS = ("podcasts", "published", "users", "subscriptions", "transactions", "success_tx")
+
+logger = logging.getLogger("app.stats")
+
+
+def bump(db: Session, **deltas: int) -> None:
+    """Изменить счётчики на заданные дельты, например bump(db, users=1). Коммит — на вызывающей стороне."""
+    values = {
+        name: getattr(models.StatsCounters, name) + delta
+        for name, delta in deltas.items()
+        if delta and name in COUNTERS
+    }
+    if values:
+        db.execute(update(models.StatsCounters).where(models.StatsCounters.id == ROW_ID).values(**values))
+
+
+def read(db: Session) -> dict:
+    """Все счётчики одним чтением строки по первичному ключу."""
+    row = db.get(models.StatsCounters, ROW_ID)
+    if row is None:
+        row = reconcile(db)
+    return {name: getattr(row, name) or 0 for name in COUNTERS}
+
+
+def ensure_row(db: Session) -> None:
+    """Создать строку счётчиков, если её ещё нет (до первого bump)."""
+    db.execute(dialect_insert(db, models.StatsCounters.__table__).values(id=ROW_ID).on_conflict_do_nothing())
+    db.commit()
+
+
+def reconcile(db: Session) -> models.StatsCounters:
+    """
+    Пересчитать счётчики по таблицам (полные COUNT-ы, только для фоновой задачи).
+    COUNT-ы и текущие значения счётчиков читаются одним SELECT-ом, то есть из одного снимка
+    и без блокировки на запись. Потом короткой записью применяется только разница
+    value = value + (actual - snapshot): bump()-ы, прошедшие во время подсчёта, не теряются.
+    """
+    podcast, user, txn, row_model = models.Podcast, models.User, models.Transaction, models.StatsCounters
+    ensure_row(db)
+    snapshot = db.execute(
+        select(
+            select(func.count()).select_from(podcast).scalar_subquery(),
+            select(func.count()).select_from(podcast).where(podcast.is_published.is_(True)).scalar_subquery(),
+            select(func.count()).select_from(user).scalar_subquery(),
+            select(func.count()).select_from(user).where(user.has_subscription.is_(True)).scalar_subquery(),
+            select(func.count()).select_from(txn).scalar_subquery(),
+            select(func.count()).select_from(txn).where(txn.status == "success").scalar_subquery(),
+            *(getattr(row_model, name) for name in COUNTERS),
+        ).where(row_model.id == ROW_ID)
+    ).one()
+    db.commit()  # закрыть чтение до записи
+    actual, counted = snapshot[: len(COUNTERS)], snapshot[len(COUNTERS) :]
+    drift = {name: a - (c or 0) for name, a, c in zip(COUNTERS, actual, counted) if a != (c or 0)}
+
+    values = {name: func.coalesce(getattr(row_model, name), 0) + delta for name, delta in drift.items()}
+    db.execute(update(row_model).where(row_model.id == ROW_ID).values(reconciled_at=datetime.utcnow(), **values))
+    db.commit()
+    if drift:
+        logger.info("stats reconciled, drift=%s", drift)
+    return db.get(row_model, ROW_ID, populate_existing=True)
+
+
+def reconcile_job() -> None:
+    db = SessionLocal()
+    try:
+        reconcile(db)
+    finally:
+        db.close()
@@ -1,8 +1,24 @@
 import hashlib
 import hmac
 import json
-from typing import Dict, Any
-from urllib.parse import parse_qsl, unquote
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+from urllib.parse import parse_qsl
+
+from .cache import TTLCache
+from .config import settings
+
+
+# Недавно проверенные initData: повторный запуск Mini App с той же строкой
+# не пересчитывает HMAC и не ходит в БД (ключ — (bot_token, init_data))
+_verified = TTLCache(settings.telegram_auth_cache_size, settings.telegram_auth_cache_ttl_seconds)
+
+# допустимое опережение auth_date из-за расхождения часов
+_CLOCK_SKEW_SECONDS = 60
+# hash в initData — hex от HMAC-SHA256
+_HASH_RE = re.compile(r"[0-9a-fA-F]{64}")
 
 
 def _build_data_check_string(data: Dict[str, str]) -> str:
@@ -14,35 +30,53 @@ def _build_data_check_string(data: Dict[str, str]) -> str:
     return "\n".join(pairs)
 
 
-def validate_init_data(init_data: str, bot_token: str) -> Dict[str, Any]:
+@lru_cache(maxsize=8)
+def _secret_key(bot_token: str) -> bytes:
+    # secret_key = HMAC_SHA256("WebAppData", bot_token) — зависит только от токена
+    return hmac.new(key=b"WebAppData", msg=bot_token.encode("utf-8"), digestmod=hashlib.sha256).digest()
+
+
+def _is_fresh(auth_date: int, max_age: int) -> bool:
+    if max_age <= 0:
+        return True
+    age = time.time() - auth_date
+    return -_CLOCK_SKEW_SECONDS <= age <= max_age
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: int | None = None) -> Tuple[Dict[str, Any], bool]:
     """
     Validates Telegram WebApp initData string per docs.
-    Returns parsed dict (including 'user' parsed) if valid, else {}.
+    Returns (parsed dict with 'user' parsed, from_cache); ({}, False) if invalid or expired.
+    max_age — допустимый возраст auth_date в секундах (по умолчанию TELEGRAM_AUTH_MAX_AGE_SECONDS, 0 — не проверять).
     """
     if not init_data or not bot_token:
-        return {}
+        return {}, False
+    max_age = settings.telegram_auth_max_age_seconds if max_age is None else max_age
+
+    cached = _verified.get((bot_token, init_data))
+    if cached is not None:
+        auth_date, result = cached
+        return (result, True) if _is_fresh(auth_date, max_age) else ({}, False)
 
-    # Parse query-like string
+    # parse_qsl уже декодирует percent-encoding
     pairs = dict(parse_qsl(init_data, keep_blank_values=True))
-    # decode percent-encoding
-    pairs = {k: unquote(v) for k, v in pairs.items()}
     tg_hash = pairs.get("hash", "")
-    if not tg_hash:
-        return {}
-
-    data_check_string = _build_data_check_string(pairs)
-
-    # secret_key = HMAC_SHA256("WebAppData", bot_token)
-    secret_key = hmac.new(
-        key=b"WebAppData", msg=bot_token.encode("utf-8"), digestmod=hashlib.sha256
-    ).digest()
+    # не-ASCII строка в compare_digest дала бы TypeError (500 вместо отказа)
+    if not _HASH_RE.fullmatch(tg_hash):
+        return {}, False
 
     computed_hash = hmac.new(
-        key=secret_key, msg=data_check_string.encode("utf-8"), digestmod=hashlib.sha256
+        key=_secret_key(bot_token), msg=_build_data_check_string(pairs).encode("utf-8"), digestmod=hashlib.sha256
     ).hexdigest()
+    if not hmac.compare_digest(computed_hash.encode("ascii"), tg_hash.lower().encode("ascii")):
+        return {}, False
 
-    if computed_hash != tg_hash:
-        return {}
+    try:
+        auth_date = int(pairs.get("auth_date", ""))
+    except ValueError:
+        auth_date = 0
+    if max_age > 0 and not _is_fresh(auth_date, max_age):
+        return {}, False
 
     # Parse user JSON if present
     result: Dict[str, Any] = dict(pairs)
@@ -52,6 +86,14 @@ def validate_init_data(init_data: str, bot_token: str) -> Dict[str, Any]:
         except Exception:
             pass
 
-    return result
+    _verified.set((bot_token, init_data), (auth_date, result))
+    return result, False
+
+
+def validate_init_data(init_data: str, bot_token: str) -> Dict[str, Any]:
+    """Parsed initData if valid, else {} (см. verify_init_data)."""
+    return verify_init_data(init_data, bot_token)[0]
 
 
+def cache_stats() -> dict:
+    return _verified.stats()
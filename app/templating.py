@@ -0,0 +1,99 @@
+"""
+Общее Jinja-окружение для всех роутеров (шаблоны компилируются один раз на воркер).
+
+Скомпилированный байткод сохраняется в TEMPLATES_CACHE_DIR и переживает перезапуск;
+auto_reload (проверка mtime файла на каждом рендере) включается только TEMPLATES_AUTO_RELOAD=1.
+
+Тег {% cache ... %} кэширует готовый HTML фрагмента по ключу из своих аргументов:
+
+    {% cache "podcasts-grid", listing_key %} ... {% endcache %}
+
+Ключ должен включать всё, от чего фрагмент зависит, и браться из тех же данных, что
+рендерятся: для сетки — хэш из catalog.published_listing(), он же идёт в ETag. Счётчик
+catalog.version() не годится: правку из другого процесса он не видит. TTL (CATALOG_CACHE_TTL_SECONDS)
+только ограничивает память под старые ключи.
+"""
+import hashlib
+import os
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from fastapi.templating import Jinja2Templates
+
+from .cache import TTLCache
+from .config import settings
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment: jinja2.Environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=TTLCache(maxsize=256, ttl=settings.catalog_cache_ttl_seconds))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_cached_fragment", [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(self, key_parts: list, caller) -> str:
+        key = tuple(key_parts)
+        cache = self.environment.fragment_cache
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html)
+        return html
+
+
+def _bytecode_cache() -> jinja2.BytecodeCache | None:
+    if not settings.templates_cache_dir:
+        return None
+    try:
+        os.makedirs(settings.templates_cache_dir, exist_ok=True)
+    except OSError:
+        return None  # read-only FS: компилируем в памяти, как раньше
+    return jinja2.FileSystemBytecodeCache(settings.templates_cache_dir)
+
+
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("templates"),
+    autoescape=True,
+    auto_reload=settings.templates_auto_reload,
+    bytecode_cache=_bytecode_cache(),
+    extensions=[FragmentCacheExtension],
+)
+
+templates = Jinja2Templates(env=env)
+
+
+def _hash_templates(directory: str = "templates") -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+_fingerprint = _hash_templates()
+
+
+def templates_fingerprint() -> str:
+    """
+    Хэш содержимого шаблонов для ETag страниц: новый деплой с другими шаблонами меняет ETag,
+    одинаковые шаблоны на разных серверах дают одинаковый. С auto_reload считается заново.
+    """
+    return _hash_templates() if settings.templates_auto_reload else _fingerprint
+
+
+def fragment_cache_stats() -> dict:
+    return env.fragment_cache.stats()
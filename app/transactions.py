@@ -0,0 +1,167 @@
+"""
+Pending-транзакции оформления оплаты: повторное использование и периодическая уборка.
+
+Повторный клик «Оплатить» с тем же товаром в течение PENDING_REUSE_SECONDS отдаёт уже
+созданную pending-транзакцию (и её закэшированную ссылку Payform) вместо новой строки;
+более старая pending на тот же товар при этом помечается expired.
+reap() помечает брошенные pending как expired, а старые expired переносит в transactions_archive.
+Если по заархивированному заказу всё же приходит оплата, restore_archived() возвращает строку.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal, dialect_insert
+from . import models, stats
+
+
+logger = logging.getLogger("app.payments")
+
+REAP_BATCH = 1000
+
+
+def get_or_create_pending(db: Session, user_id: int, tx_type: str, podcast_id: int | None) -> models.Transaction:
+    """
+    Свежая pending-транзакция пользователя на тот же товар или новая (с коммитом).
+    Pending на товар одна (индекс uq_transactions_pending_item), поэтому параллельные клики
+    не создают дублей: INSERT ... ON CONFLICT DO NOTHING RETURNING id, как users.upsert().
+    Pending старше PENDING_REUSE_SECONDS перед этим помечается expired.
+    """
+    txn = models.Transaction
+    same_item = (
+        txn.user_id == user_id,
+        txn.status == "pending",
+        txn.type == tx_type,
+        txn.podcast_id.is_(None) if podcast_id is None else txn.podcast_id == podcast_id,
+    )
+    for _ in range(3):
+        now = datetime.utcnow()
+        db.execute(
+            update(txn)
+            .where(*same_item, txn.created_at < now - timedelta(seconds=max(0, settings.pending_reuse_seconds)))
+            .values(status="expired")
+            .execution_options(synchronize_session=False)
+        )
+        stmt = (
+            dialect_insert(db, txn.__table__)
+            .values(user_id=user_id, type=tx_type, podcast_id=podcast_id, status="pending", created_at=now)
+            # без цели: SQLite сопоставляет цель с выражением индекса дословно (без параметров),
+            # а другой уникальный ключ, кроме id, тут нарушить нельзя
+            .on_conflict_do_nothing()
+            .returning(txn.id)
+        )
+        created_id = db.execute(stmt).scalar()
+        if created_id is not None:
+            stats.bump(db, transactions=1)
+        db.commit()
+        if created_id is not None:
+            return db.get(txn, created_id)
+        existing = db.query(txn).filter(*same_item).order_by(txn.id.desc()).first()
+        if existing:
+            return existing
+        # строку победителя уже успели оплатить или пометить expired — пробуем вставить снова
+    raise RuntimeError(f"could not create a pending transaction for user {user_id}")
+
+
+def expire_duplicate_pending(db: Session) -> int:
+    """
+    Оставить по одной pending на пользователя и товар (самую новую), остальные — expired.
+    Нужно один раз перед созданием uq_transactions_pending_item в базе, где дубли уже есть.
+    """
+    txn = models.Transaction
+    newest = (
+        select(func.max(txn.id))
+        .where(txn.status == "pending")
+        .group_by(txn.user_id, txn.type, func.coalesce(txn.podcast_id, 0))
+    )
+    expired = db.execute(
+        update(txn)
+        .where(txn.status == "pending", txn.id.not_in(newest))
+        .values(status="expired")
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+    db.commit()
+    if expired:
+        logger.info("duplicate pending transactions expired: %s", expired)
+    return expired
+
+
+def _archive_expired(db: Session, before: datetime) -> int:
+    """Перенести expired старше before в transactions_archive пачками. Возвращает число строк."""
+    txn, archive = models.Transaction, models.TransactionArchive
+    moved = 0
+    while True:
+        ids = db.execute(
+            select(txn.id).where(txn.status == "expired", txn.created_at < before).order_by(txn.id).limit(REAP_BATCH)
+        ).scalars().all()
+        if not ids:
+            return moved
+        db.execute(
+            insert(archive).from_select(
+                ["id", "user_id", "type", "podcast_id", "status", "created_at", "archived_at"],
+                select(
+                    txn.id, txn.user_id, txn.type, txn.podcast_id, txn.status, txn.created_at,
+                    literal(datetime.utcnow()),
+                ).where(txn.id.in_(ids)),
+            )
+        )
+        db.execute(delete(txn).where(txn.id.in_(ids)).execution_options(synchronize_session=False))
+        stats.bump(db, transactions=-len(ids))
+        db.commit()
+        moved += len(ids)
+
+
+def restore_archived(db: Session, ids: set[int]) -> list[models.Transaction]:
+    """
+    Вернуть транзакции из transactions_archive в transactions (поздний webhook об оплате
+    старого заказа). Возвращает восстановленные строки. Коммит — на вызывающей стороне.
+    """
+    txn, archive = models.Transaction, models.TransactionArchive
+    if not ids:
+        return []
+    db.execute(
+        insert(txn).from_select(
+            ["id", "user_id", "type", "podcast_id", "status", "created_at"],
+            select(archive.id, archive.user_id, archive.type, archive.podcast_id, archive.status, archive.created_at)
+            .where(archive.id.in_(ids)),
+        )
+    )
+    db.execute(delete(archive).where(archive.id.in_(ids)).execution_options(synchronize_session=False))
+    restored = db.query(txn).filter(txn.id.in_(ids)).all()
+    stats.bump(db, transactions=len(restored))
+    for row in restored:
+        logger.info("transaction %s restored from archive for a late payment event", row.id)
+    return restored
+
+
+def reap(db: Session) -> tuple[int, int]:
+    """Пометить брошенные pending как expired и заархивировать старые expired. (expired, archived)."""
+    txn = models.Transaction
+    now = datetime.utcnow()
+    expired = 0
+    if settings.pending_expire_seconds > 0:
+        expired = db.execute(
+            update(txn)
+            .where(txn.status == "pending", txn.created_at < now - timedelta(seconds=settings.pending_expire_seconds))
+            .values(status="expired")
+            .execution_options(synchronize_session=False)
+        ).rowcount or 0
+        db.commit()
+    archived = 0
+    if settings.transactions_archive_days > 0:
+        archived = _archive_expired(db, now - timedelta(days=settings.transactions_archive_days))
+        db.expunge_all()  # удалённые строки могли остаться в identity map
+    if expired or archived:
+        logger.info("pending transactions reaped: expired=%s archived=%s", expired, archived)
+    return expired, archived
+
+
+def reap_job() -> None:
+    db = SessionLocal()
+    try:
+        reap(db)
+    finally:
+        db.close()
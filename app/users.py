@@ -0,0 +1,31 @@
+"""Пользователи Mini App: создание по telegram_id одним запросом."""
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from . import models, stats
+
+
+def upsert(db: Session, telegram_id: str) -> tuple[int, bool]:
+    """
+    id пользователя с данным telegram_id и признак «создан сейчас».
+    INSERT ... ON CONFLICT DO NOTHING RETURNING id: параллельные первые запуски
+    не падают на unique-ограничении; для существующего пользователя — ещё один SELECT.
+    """
+    telegram_id = str(telegram_id)
+    stmt = (
+        dialect_insert(db, models.User.__table__)
+        .values(telegram_id=telegram_id, created_at=datetime.utcnow(), has_subscription=False)
+        .on_conflict_do_nothing(index_elements=["telegram_id"])
+        .returning(models.User.__table__.c.id)
+    )
+    user_id = db.execute(stmt).scalar()
+    created = user_id is not None
+    if created:
+        stats.bump(db, users=1)
+    else:
+        user_id = db.execute(select(models.User.id).where(models.User.telegram_id == telegram_id)).scalar_one()
+    db.commit()
+    return user_id, created
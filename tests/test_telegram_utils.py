@@ -0,0 +1,18 @@
+from app.telegram_utils import verify_init_data
+from tools.bench_db import BENCH_BOT_TOKEN, make_init_data
+
+
+def test_valid_init_data_is_accepted():
+    result, _ = verify_init_data(make_init_data(BENCH_BOT_TOKEN, 42), BENCH_BOT_TOKEN)
+    assert result["user"]["id"] == 42
+
+
+def test_malformed_hash_is_rejected_without_error():
+    for init_data in ("auth_date=1&hash=%C3%A9", "auth_date=1&hash=abc", "auth_date=1&hash=" + "z" * 64):
+        assert verify_init_data(init_data, BENCH_BOT_TOKEN) == ({}, False)
+
+
+def test_wrong_hash_is_rejected():
+    init_data = make_init_data(BENCH_BOT_TOKEN, 42)
+    tampered = init_data[: init_data.index("hash=") + 5] + "0" * 64
+    assert verify_init_data(tampered, BENCH_BOT_TOKEN) == ({}, False)
@@ -0,0 +1,32 @@
+"""
+Заполнить user_entitlements из существующих успешных транзакций и подписок.
+
+    python -m tools.backfill_entitlements
+
+Безопасно запускать повторно: уже выданные права не дублируются.
+"""
+import sys
+import os
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.database import Base, engine, SessionLocal
+from app import entitlements
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        inserted = entitlements.backfill(db)
+        print(f"Backfill completed: {inserted} entitlements added.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
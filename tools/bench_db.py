@@ -0,0 +1,226 @@
+"""
+Нагрузочный бенчмарк SQLite-профиля: чтение /admin/transactions параллельно с записью
+в /api/payments/webhook.
+
+Читаем админский список транзакций: он каждый раз идёт в БД (JOIN с users/podcasts)
+по той же таблице, куда пишут webhook-и. /podcasts для этого не годится — он отдаётся
+из снимка каталога в памяти и SQLite почти не трогает.
+
+    python tools/bench_db.py --readers 16 --duration 10
+    python tools/bench_db.py --journal-mode DELETE --synchronous FULL   # старый профиль
+
+Поднимает uvicorn в отдельном потоке на временной БД, поэтому рабочие данные не трогает.
+"""
+import argparse
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+BENCH_BOT_TOKEN = "123456:BENCH-TOKEN"
+BENCH_PAYFORM_SECRET = "bench-secret"
+BENCH_ADMIN_PASSWORD = "bench-admin"
+READ_PATH = "/admin/transactions?limit=50"
+
+
+def make_init_data(bot_token: str, telegram_id: int) -> str:
+    """Собираем валидный Telegram initData, подписанный тестовым токеном."""
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"bench-{telegram_id}",
+        "user": json.dumps({"id": telegram_id, "first_name": "Bench"}, separators=(",", ":")),
+    }
+    data_check_string = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8, help="параллельных читателей /admin/transactions")
+    parser.add_argument("--writers", type=int, default=1, help="параллельных отправителей webhook")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность, сек")
+    parser.add_argument("--podcasts", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=5000, help="транзакций в БД до старта")
+    parser.add_argument("--journal-mode", default=None, help="переопределить SQLITE_JOURNAL_MODE")
+    parser.add_argument("--synchronous", default=None, help="переопределить SQLITE_SYNCHRONOUS")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте app.*, поэтому окружение готовим заранее;
+    # static/ и templates/ ищутся относительно cwd
+    os.chdir(PROJECT_ROOT)
+    tmp_dir = tempfile.mkdtemp(prefix="bench-db-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/app.db"
+    os.environ["BOT_TOKEN"] = BENCH_BOT_TOKEN
+    os.environ["PAYFORM_SECRET"] = BENCH_PAYFORM_SECRET
+    os.environ["ADMIN_LOGIN"] = "admin"
+    os.environ["ADMIN_PASSWORD"] = BENCH_ADMIN_PASSWORD
+    if args.journal_mode:
+        os.environ["SQLITE_JOURNAL_MODE"] = args.journal_mode
+    if args.synchronous:
+        os.environ["SQLITE_SYNCHRONOUS"] = args.synchronous
+
+    import logging
+    import uvicorn
+    from app.main import app
+    from app.database import SessionLocal, engine
+    from sqlalchemy import insert
+    from app.payments import create_signature
+    from app import models
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    db = SessionLocal()
+    try:
+        podcasts = [
+            models.Podcast(title=f"Bench {i}", category="bench", is_published=True) for i in range(args.podcasts)
+        ]
+        db.add_all(podcasts)
+        buyer = models.User(telegram_id="bench-buyer")
+        db.add(buyer)
+        db.commit()
+        buyer_id = buyer.id
+        db.execute(
+            insert(models.Transaction),
+            [
+                {"user_id": buyer_id, "type": "single", "podcast_id": podcasts[i % len(podcasts)].id, "status": "success"}
+                if podcasts
+                else {"user_id": buyer_id, "type": "subscription", "status": "success"}
+                for i in range(args.transactions)
+            ],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request(
+        "POST",
+        "/admin/login",
+        body=urlencode({"username": "admin", "password": BENCH_ADMIN_PASSWORD}),
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    resp = conn.getresponse()
+    resp.read()
+    cookie = (resp.getheader("set-cookie") or "").split(";", 1)[0]
+    if resp.status != 302 or not cookie:
+        raise SystemExit(f"admin login failed: {resp.status}")
+
+    stop_at = time.perf_counter() + args.duration
+    read_latencies: list[float] = []
+    write_latencies: list[float] = []
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+
+    def reader() -> None:
+        c = http.client.HTTPConnection("127.0.0.1", port)
+        local: list[float] = []
+        failed = 0
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            c.request("GET", READ_PATH, headers={"Cookie": cookie})
+            r = c.getresponse()
+            r.read()
+            if r.status == 200:
+                local.append(time.perf_counter() - t0)
+            else:
+                failed += 1
+        with lock:
+            read_latencies.extend(local)
+            errors["read"] += failed
+
+    def writer() -> None:
+        c = http.client.HTTPConnection("127.0.0.1", port)
+        s = SessionLocal()
+        local: list[float] = []
+        failed = 0
+        while time.perf_counter() < stop_at:
+            # у пользователя одна pending на товар (uq_transactions_pending_item), а webhook применяется
+            # фоном — заказ пишем брошенным (expired); оплата по нему проходит так же
+            txn = models.Transaction(user_id=buyer_id, type="single", status="expired")
+            s.add(txn)
+            s.commit()
+            data = {"order_id": f"txn-{txn.id}", "status": "success"}
+            body = json.dumps(data)
+            t0 = time.perf_counter()
+            c.request(
+                "POST",
+                "/api/payments/webhook",
+                body=body,
+                headers={"Content-Type": "application/json", "Sign": create_signature(data, BENCH_PAYFORM_SECRET)},
+            )
+            r = c.getresponse()
+            r.read()
+            if r.status == 200:
+                local.append(time.perf_counter() - t0)
+            else:
+                failed += 1
+        s.close()
+        with lock:
+            write_latencies.extend(local)
+            errors["write"] += failed
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    with engine.connect() as c:
+        journal_mode = c.exec_driver_sql("PRAGMA journal_mode").scalar()
+
+    print(f"journal_mode={journal_mode} readers={args.readers} writers={args.writers} duration={elapsed:.1f}s")
+    for name, lat in (("GET /admin/transactions", read_latencies), ("POST /api/payments/webhook", write_latencies)):
+        if not lat:
+            print(f"{name:28s} no successful requests")
+            continue
+        print(
+            f"{name:28s} {len(lat) / elapsed:8.1f} req/s  "
+            f"p50={statistics.median(lat) * 1000:6.1f}ms  "
+            f"p95={percentile(lat, 95) * 1000:6.1f}ms  "
+            f"p99={percentile(lat, 99) * 1000:6.1f}ms"
+        )
+    print(f"errors: read={errors['read']} write={errors['write']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Бенчмарк накладных расходов логирования в middleware: одно и то же приложение
+с разными настройками LOG_* гоняется напрямую через ASGI (без сети), логи пишутся в файл.
+
+    python tools/bench_logging.py --requests 20000 --concurrency 1 --sink-delay-ms 2
+
+stdout дочернего процесса читается через pipe; --sink-delay-ms имитирует медленный
+сборщик логов (docker/journald), на котором синхронный StreamHandler блокирует event loop.
+
+Варианты:
+  off        — LOG_LEVEL=WARNING, access-строки не пишутся (нижняя граница)
+  legacy     — синхронный StreamHandler, текст, дамп заголовков в каждой строке (как было)
+  queue      — QueueHandler + JSON, заголовки только для ошибок
+  queue-1%   — то же плюс LOG_SAMPLING=app.http=0.01
+Каждый вариант запускается в отдельном процессе.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from tools.bench_db import percentile
+
+
+VARIANTS = {
+    "off": {"LOG_LEVEL": "WARNING"},
+    "legacy": {"LOG_QUEUE": "0", "LOG_FORMAT": "text", "LOG_HEADERS": "all"},
+    "queue": {"LOG_QUEUE": "1", "LOG_FORMAT": "json", "LOG_HEADERS": "errors"},
+    "queue-1%": {"LOG_QUEUE": "1", "LOG_FORMAT": "json", "LOG_HEADERS": "errors", "LOG_SAMPLING": "app.http=0.01"},
+}
+
+
+async def _call(app, path: str) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench.local"),
+            (b"user-agent", b"Mozilla/5.0 (bench) TelegramWebApp"),
+            (b"accept", b"text/html,application/json"),
+            (b"accept-language", b"ru-RU,ru;q=0.9"),
+            (b"referer", b"https://web.telegram.org/"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench.local", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - started
+
+
+async def _run(app, path: str, requests: int, concurrency: int) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            latencies.append(await _call(app, path))
+
+    for _ in range(200):  # прогрев
+        await _call(app, path)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def child(args) -> None:
+    os.chdir(PROJECT_ROOT)
+    from app.main import app
+
+    latencies, elapsed = asyncio.run(_run(app, args.path, args.requests, args.concurrency))
+    result = {
+        "rps": len(latencies) / elapsed,
+        "mean_us": statistics.mean(latencies) * 1e6,
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+    }
+    print(json.dumps(result), file=sys.stderr)
+
+
+def _drain(pipe, log_path: str, delay: float) -> None:
+    with open(log_path, "wb") as out:
+        while chunk := pipe.read1(16 * 1024):
+            out.write(chunk)
+            if delay:
+                time.sleep(delay)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--path", default="/api/whoami")
+    parser.add_argument("--rounds", type=int, default=3, help="прогонов на вариант, берётся лучший")
+    parser.add_argument("--sink-delay-ms", type=float, default=0.0, help="пауза читателя stdout на каждые 16 KiB")
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        child(args)
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench-logging-")
+    baseline = None
+    for name, overrides in VARIANTS.items():
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_dir}/app.db", MEDIA_WORKERS="0", **overrides)
+        log_path = os.path.join(tmp_dir, f"{name}.log")
+        results = []
+        for _ in range(max(1, args.rounds)):
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--variant", name,
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency), "--path", args.path],
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            reader = threading.Thread(target=_drain, args=(proc.stdout, log_path, args.sink_delay_ms / 1000))
+            reader.start()
+            stderr = proc.stderr.read().decode()
+            reader.join()
+            if proc.wait() != 0:
+                raise SystemExit(f"variant {name} failed:\n{stderr}")
+            results.append(json.loads(stderr.strip().splitlines()[-1]))
+        result = min(results, key=lambda r: r["mean_us"])
+        if baseline is None:
+            baseline = result["mean_us"]
+        print(
+            f"{name:10s} {result['rps']:9.0f} req/s  mean={result['mean_us']:8.1f}us  "
+            f"p50={result['p50_us']:8.1f}us  p99={result['p99_us']:8.1f}us  "
+            f"overhead={result['mean_us'] - baseline:+7.1f}us/req  log={os.path.getsize(log_path) // 1024}KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
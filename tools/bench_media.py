@@ -0,0 +1,139 @@
+"""
+Бенчмарк отдачи аудио: параллельные Range-запросы к эндпоинту /podcasts/{id}/audio/<file>
+против прежнего StaticFiles-маунта /uploads.
+
+    python tools/bench_media.py --clients 16 --duration 10 --size-mb 50
+
+Файл и БД создаются во временных каталогах/с временным именем и удаляются после прогона.
+"""
+import argparse
+import http.client
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from tools.bench_db import BENCH_BOT_TOKEN, free_port, make_init_data, percentile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="секунд на каждый вариант")
+    parser.add_argument("--size-mb", type=int, default=20, help="размер тестового файла")
+    parser.add_argument("--range-kb", type=int, default=256, help="размер запрашиваемого диапазона")
+    args = parser.parse_args()
+
+    os.chdir(PROJECT_ROOT)
+    tmp_dir = tempfile.mkdtemp(prefix="bench-media-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/app.db"
+    os.environ["BOT_TOKEN"] = BENCH_BOT_TOKEN
+
+    import logging
+    import uvicorn
+    from app.main import app
+    from app.config import settings
+    from app.database import SessionLocal
+    from app import models
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    size = args.size_mb * 1024 * 1024
+    name = f"bench-{os.getpid()}.mp3"
+    path = os.path.join(settings.uploads_dir, name)
+    with open(path, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    try:
+        db = SessionLocal()
+        podcast = models.Podcast(title="Bench", is_published=True, is_free=True, audio_full_path=f"/uploads/{name}")
+        db.add(podcast)
+        db.commit()
+        podcast_id = podcast.id
+        db.close()
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request(
+            "POST",
+            "/api/telegram/auth",
+            body=urlencode({"init_data": make_init_data(BENCH_BOT_TOKEN, 555)}),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        resp = conn.getresponse()
+        resp.read()
+        cookie = (resp.getheader("set-cookie") or "").split(";", 1)[0]
+
+        span = args.range_kb * 1024
+        variants = {
+            "StaticFiles /uploads": f"/uploads/{name}",
+            "audio endpoint": f"/podcasts/{podcast_id}/audio/{name}",
+        }
+        for label, url in variants.items():
+            latencies: list[float] = []
+            transferred = [0]
+            errors = [0]
+            lock = threading.Lock()
+            stop_at = time.perf_counter() + args.duration
+
+            def client() -> None:
+                c = http.client.HTTPConnection("127.0.0.1", port)
+                rnd = random.Random()
+                local: list[float] = []
+                got = 0
+                failed = 0
+                while time.perf_counter() < stop_at:
+                    start = rnd.randrange(0, size - span)
+                    t0 = time.perf_counter()
+                    c.request("GET", url, headers={"Cookie": cookie, "Range": f"bytes={start}-{start + span - 1}"})
+                    r = c.getresponse()
+                    body = r.read()
+                    if r.status == 206 and len(body) == span:
+                        local.append(time.perf_counter() - t0)
+                        got += len(body)
+                    else:
+                        failed += 1
+                with lock:
+                    latencies.extend(local)
+                    transferred[0] += got
+                    errors[0] += failed
+
+            threads = [threading.Thread(target=client) for _ in range(args.clients)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+            if not latencies:
+                print(f"{label:22s} no successful requests (errors={errors[0]})")
+                continue
+            print(
+                f"{label:22s} {len(latencies) / elapsed:8.1f} req/s  "
+                f"{transferred[0] / elapsed / 1024 / 1024:8.1f} MiB/s  "
+                f"p50={statistics.median(latencies) * 1000:6.1f}ms  "
+                f"p99={percentile(latencies, 99) * 1000:6.1f}ms  errors={errors[0]}"
+            )
+        server.should_exit = True
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
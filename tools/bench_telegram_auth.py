@@ -0,0 +1,75 @@
+"""
+Микробенчмарк проверки Telegram initData: проверок в секунду для прежней реализации
+(ключ считается на каждый вызов, двойной unquote), новой без кэша и повторных запусков из кэша.
+
+    python tools/bench_telegram_auth.py --seconds 2 --users 1000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qsl, unquote
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from tools.bench_db import BENCH_BOT_TOKEN, make_init_data
+
+
+def legacy_validate(init_data: str, bot_token: str) -> dict:
+    """Реализация до перехода на кэшированный ключ (для сравнения)."""
+    pairs = dict(parse_qsl(init_data, keep_blank_values=True))
+    pairs = {k: unquote(v) for k, v in pairs.items()}
+    tg_hash = pairs.get("hash", "")
+    data_check_string = "\n".join(f"{k}={pairs[k]}" for k in sorted(k for k in pairs if k != "hash"))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    if hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest() != tg_hash:
+        return {}
+    result = dict(pairs)
+    result["user"] = json.loads(result["user"])
+    return result
+
+
+def measure(label: str, func, samples: list[str], seconds: float) -> None:
+    done = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for init_data in samples:
+            if not func(init_data):
+                raise SystemExit(f"{label}: verification failed")
+        done += len(samples)
+    elapsed = time.perf_counter() - started
+    print(f"{label:28s} {done / elapsed:12.0f} verifications/s  ({elapsed / done * 1e6:6.2f} us each)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="секунд на вариант")
+    parser.add_argument("--users", type=int, default=1000, help="разных initData в прогоне")
+    args = parser.parse_args()
+
+    from app import telegram_utils
+
+    samples = [make_init_data(BENCH_BOT_TOKEN, 100000 + i) for i in range(args.users)]
+
+    def uncached(init_data: str) -> dict:
+        telegram_utils._verified.clear()
+        return telegram_utils.validate_init_data(init_data, BENCH_BOT_TOKEN)
+
+    measure("legacy", lambda s: legacy_validate(s, BENCH_BOT_TOKEN), samples, args.seconds)
+    measure("precomputed key, no cache", uncached, samples, args.seconds)
+    for init_data in samples:
+        telegram_utils.validate_init_data(init_data, BENCH_BOT_TOKEN)
+    measure("verified cache hit", lambda s: telegram_utils.validate_init_data(s, BENCH_BOT_TOKEN), samples, args.seconds)
+    print("cache", telegram_utils.cache_stats())
+
+
+if __name__ == "__main__":
+    main()
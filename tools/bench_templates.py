@@ -0,0 +1,104 @@
+"""
+Бенчмарк шаблонов: холодный старт (загрузка всех шаблонов в свежем процессе) без
+байткод-кэша и с ним, и рендер front/podcasts.html: прежнее окружение (auto_reload,
+сетка каждый раз) против общего (фрагмент сетки из кэша).
+
+    python tools/bench_templates.py --podcasts 200 --renders 2000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+COLD_START = """
+import os, sys, time
+sys.path.insert(0, os.getcwd())
+import jinja2
+from app.templating import FragmentCacheExtension
+t0 = time.perf_counter()
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("templates"),
+    autoescape=True,
+    bytecode_cache=jinja2.FileSystemBytecodeCache(sys.argv[1]) if sys.argv[1] else None,
+    extensions=[FragmentCacheExtension],
+)
+for name in env.list_templates(extensions=["html"]):
+    env.get_template(name)
+print(time.perf_counter() - t0)
+"""
+
+
+def cold_start(cache_dir: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", COLD_START, cache_dir], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--podcasts", type=int, default=200, help="подкастов в сетке")
+    parser.add_argument("--renders", type=int, default=2000, help="рендеров на вариант")
+    parser.add_argument("--starts", type=int, default=5, help="холодных стартов на вариант")
+    args = parser.parse_args()
+
+    os.chdir(PROJECT_ROOT)
+    import jinja2
+    from fastapi import FastAPI
+    from fastapi.staticfiles import StaticFiles
+    from starlette.requests import Request
+    from app.catalog import PodcastSnapshot
+    from app.templating import FragmentCacheExtension, env
+    from fastapi.templating import Jinja2Templates
+
+    cache_dir = tempfile.mkdtemp(prefix="bench-jinja-")
+    no_cache = min(cold_start("") for _ in range(args.starts))
+    first = cold_start(cache_dir)
+    warm = min(cold_start(cache_dir) for _ in range(args.starts))
+    print(f"cold start, all templates: no bytecode cache {no_cache * 1000:7.1f} ms | "
+          f"cache empty {first * 1000:7.1f} ms | cache warm {warm * 1000:7.1f} ms")
+
+    class NoFragmentCache(FragmentCacheExtension):
+        def _cached_fragment(self, key_parts, caller):
+            return caller()
+
+    legacy_env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader("templates"), autoescape=True, extensions=[NoFragmentCache]
+    )
+    now = datetime(2025, 1, 1)
+    podcasts = [
+        PodcastSnapshot(
+            id=i, title=f"Подкаст {i}", description=None, category="финансы", published_at=now - timedelta(days=i),
+            duration_seconds=1800, cover_path=None, audio_preview_path=None, audio_full_path=None,
+            is_published=True, is_free=i % 7 == 0,
+        )
+        for i in range(args.podcasts)
+    ]
+    # url_for('static', ...) в шаблонах ищет маршрут у приложения из scope
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+    request = Request({"type": "http", "method": "GET", "path": "/podcasts", "headers": [], "query_string": b"",
+                       "app": app, "router": app.router, "scheme": "http", "server": ("testserver", 80), "root_path": ""})
+
+    for label, environment in (("legacy (auto_reload, no fragment cache)", legacy_env), ("shared env + fragment cache", env)):
+        templates = Jinja2Templates(env=environment)
+        ctx = {"request": request, "podcasts": podcasts, "listing_key": "bench"}
+        body = templates.TemplateResponse("front/podcasts.html", ctx).body  # прогрев
+        started = time.perf_counter()
+        for _ in range(args.renders):
+            templates.TemplateResponse("front/podcasts.html", ctx)
+        elapsed = time.perf_counter() - started
+        print(f"{label:42s} {elapsed / args.renders * 1e6:9.1f} us/render  ({len(body)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
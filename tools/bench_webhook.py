@@ -0,0 +1,150 @@
+"""
+Нагрузочный тест webhook Payform: локальный «провайдер» отправляет тысячи подписанных
+уведомлений (с повторами) в приложение на временной БД, затем ждёт, пока фоновый
+обработчик разберёт payment_events, и сверяет результат.
+
+    python tools/bench_webhook.py --orders 5000 --duplicates 0.3 --clients 16
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from tools.bench_db import BENCH_PAYFORM_SECRET, free_port, percentile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000, help="pending-транзакций и уведомлений об оплате")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="доля повторно отправляемых уведомлений")
+    parser.add_argument("--clients", type=int, default=16, help="параллельных соединений провайдера")
+    parser.add_argument("--timeout", type=float, default=120.0, help="сколько ждать разбора очереди, сек")
+    args = parser.parse_args()
+
+    os.chdir(PROJECT_ROOT)
+    tmp_dir = tempfile.mkdtemp(prefix="bench-webhook-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/app.db"
+    os.environ["PAYFORM_SECRET"] = BENCH_PAYFORM_SECRET
+    os.environ.setdefault("MEDIA_WORKERS", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import uvicorn
+    from sqlalchemy import func, insert, select
+    from app.main import app
+    from app.database import SessionLocal
+    from app.payments import create_signature
+    from app import models, stats
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            insert(models.User),
+            [{"telegram_id": f"hook-{i}", "has_subscription": False} for i in range(args.orders)],
+        )
+        user_ids = db.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+        db.execute(
+            insert(models.Transaction),
+            [{"user_id": uid, "type": "subscription", "status": "pending"} for uid in user_ids],
+        )
+        txn_ids = db.execute(select(models.Transaction.id).order_by(models.Transaction.id)).scalars().all()
+        db.commit()
+    finally:
+        db.close()
+
+    notifications = [{"order_id": f"txn-{txn_id}", "status": "success"} for txn_id in txn_ids]
+    notifications += random.sample(notifications, int(len(notifications) * args.duplicates))
+    random.shuffle(notifications)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    latencies: list[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    queue = list(notifications)
+
+    def provider() -> None:
+        c = http.client.HTTPConnection("127.0.0.1", port)
+        local: list[float] = []
+        failed = 0
+        while True:
+            with lock:
+                if not queue:
+                    break
+                data = queue.pop()
+            t0 = time.perf_counter()
+            c.request(
+                "POST",
+                "/api/payments/webhook",
+                body=json.dumps(data),
+                headers={"Content-Type": "application/json", "Sign": create_signature(data, BENCH_PAYFORM_SECRET)},
+            )
+            r = c.getresponse()
+            r.read()
+            if r.status == 200:
+                local.append(time.perf_counter() - t0)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=provider) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sent_in = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        while time.perf_counter() - started < args.timeout:
+            pending = db.execute(
+                select(func.count()).select_from(models.PaymentEvent).where(models.PaymentEvent.processed_at.is_(None))
+            ).scalar_one()
+            if not pending:
+                break
+            time.sleep(0.05)
+        drained_in = time.perf_counter() - started
+        events = db.execute(select(func.count()).select_from(models.PaymentEvent)).scalar_one()
+        success = db.execute(
+            select(func.count()).select_from(models.Transaction).where(models.Transaction.status == "success")
+        ).scalar_one()
+        counters = stats.read(db)
+    finally:
+        db.close()
+    server.should_exit = True
+
+    print(f"notifications={len(notifications)} orders={len(txn_ids)} clients={args.clients}")
+    if latencies:
+        print(
+            f"ack: {len(latencies) / sent_in:8.1f} req/s  p50={statistics.median(latencies) * 1000:6.1f}ms  "
+            f"p95={percentile(latencies, 95) * 1000:6.1f}ms  p99={percentile(latencies, 99) * 1000:6.1f}ms  "
+            f"errors={errors[0]}"
+        )
+    print(f"all acked in {sent_in:.2f}s, inbox drained in {drained_in:.2f}s (pending={pending})")
+    ok = events == len(txn_ids) and success == len(txn_ids) and counters["success_tx"] == len(txn_ids)
+    print(
+        f"events={events} success_txns={success} success_tx counter={counters['success_tx']} "
+        f"subscriptions={counters['subscriptions']} -> {'OK' if ok else 'MISMATCH'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Сквозной нагрузочный тест Mini App: виртуальные пользователи с валидным Telegram initData
+гоняют смесь запросов (auth, главная, список, карточка, checkout, webhook) против настоящего
+app.main:app и печатают p50/p95/p99 и пропускную способность по каждому маршруту.
+
+Работает без сети: PAYFORM_URL указывает на локальный фейк, который проверяет подпись
+ссылки из /checkout и сам формирует подписанные уведомления об оплате для /api/payments/webhook.
+
+    python tools/loadtest.py --users 50 --concurrency 16 --duration 20
+    python tools/loadtest.py --mode uvicorn --mix "home=2,list=2,detail=6,checkout=1,webhook=1"
+
+Режимы: inprocess — httpx через ASGI без сокетов (удобно для профилирования),
+uvicorn — настоящий HTTP-сервер в соседнем потоке.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import unquote, urlsplit
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from tools.bench_db import BENCH_BOT_TOKEN, BENCH_PAYFORM_SECRET, free_port, make_init_data, percentile
+
+FAKE_PAYFORM_URL = "http://payform.invalid/"
+DEFAULT_MIX = "auth=1,home=3,list=3,detail=5,checkout=1,webhook=1"
+ROUTES = ("auth", "home", "list", "detail", "checkout", "webhook")
+
+
+def parse_mix(raw: str) -> dict[str, int]:
+    mix = {}
+    for part in filter(None, (p.strip() for p in raw.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in ROUTES:
+            raise SystemExit(f"unknown route in --mix: {name} (known: {', '.join(ROUTES)})")
+        mix[name] = int(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+class FakePayform:
+    """Локальная замена Payform: разбирает ссылку на оплату и «оплачивает» заказ."""
+
+    def __init__(self, secret: str) -> None:
+        self.secret = secret
+        self.pending: list[str] = []
+        self.paid: list[str] = []
+        self.bad_links = 0
+
+    def accept(self, link: str) -> bool:
+        """Проверить ссылку из редиректа /checkout; заказ встаёт в очередь на оплату."""
+        from app.payments import create_signature
+
+        if not link.startswith(FAKE_PAYFORM_URL):
+            self.bad_links += 1
+            return False
+        # ссылка собирается без URL-кодирования (экранирует только RedirectResponse), разбираем «в лоб»
+        pairs = [p.partition("=") for p in urlsplit(link).query.split("&")]
+        fields = {unquote(k): unquote(v) for k, _, v in pairs}
+        products, flat = {}, {}
+        for key, value in fields.items():
+            if key.startswith("products["):
+                idx, attr = key[len("products["):].rstrip("]").split("][")
+                products.setdefault(int(idx), {})[attr] = value
+            elif key != "signature":
+                flat[key] = value
+        flat["products"] = [products[i] for i in sorted(products)]
+        if create_signature(flat, self.secret) != fields.get("signature"):
+            self.bad_links += 1
+            return False
+        self.pending.append(fields["order_id"])
+        return True
+
+    def notification(self) -> tuple[dict, str] | None:
+        """Следующее уведомление: оплата ожидающего заказа или повтор уже отправленного."""
+        from app.payments import create_signature
+
+        if self.pending:
+            order_id = self.pending.pop(0)
+            self.paid.append(order_id)
+        elif self.paid:
+            order_id = random.choice(self.paid)  # провайдер повторяет доставку
+        else:
+            return None
+        data = {"order_id": order_id, "status": "success", "sum": "1"}
+        return data, create_signature(data, self.secret)
+
+
+class VirtualUser:
+    def __init__(self, client, telegram_id: int, podcast_ids: list[int], payform: FakePayform) -> None:
+        self.client = client
+        self.telegram_id = telegram_id
+        self.podcast_ids = podcast_ids
+        self.payform = payform
+        self.authed = False
+
+    async def run(self, route: str) -> bool:
+        """Один запрос маршрута route. True — ответ ожидаемый."""
+        c = self.client
+        if route == "auth" or not self.authed:
+            r = await c.post("/api/telegram/auth", data={"init_data": make_init_data(BENCH_BOT_TOKEN, self.telegram_id)})
+            self.authed = r.status_code == 200
+            return self.authed
+        if route == "home":
+            r = await c.get("/")
+        elif route == "list":
+            r = await c.get("/podcasts")
+        elif route == "detail":
+            r = await c.get(f"/podcasts/{random.choice(self.podcast_ids)}")
+        elif route == "checkout":
+            if random.random() < 0.5:
+                form = {"tariff": "subscription", "customer_phone": "+70000000000"}
+            else:
+                form = {"tariff": "single", "podcast_id": str(random.choice(self.podcast_ids)), "customer_phone": "+70000000000"}
+            r = await c.post("/checkout", data=form)
+            return r.status_code == 302 and self.payform.accept(r.headers.get("location", ""))
+        else:
+            note = self.payform.notification()
+            if note is None:
+                return await self.run("checkout")
+            data, sign = note
+            r = await c.post("/api/payments/webhook", json=data, headers={"Sign": sign})
+        # без сессии страницы отдают заглушку-загрузчик со статусом 200 — это тоже ошибка
+        return r.status_code == 200 and "<title>Loader</title>" not in r.text
+
+
+def seed(podcasts: int) -> list[int]:
+    from sqlalchemy import insert, select
+    from app.database import SessionLocal
+    from app import models
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            insert(models.Podcast),
+            [
+                {"title": f"Load {i}", "description": "load test " * 20, "category": "load", "is_published": True}
+                for i in range(podcasts)
+            ],
+        )
+        db.commit()
+        return db.execute(select(models.Podcast.id)).scalars().all()
+    finally:
+        db.close()
+
+
+async def drive(args, base_url: str, transport) -> tuple[dict, dict, float, FakePayform]:
+    import httpx
+
+    podcast_ids = seed(args.podcasts)
+    mix = parse_mix(args.mix)
+    routes, weights = list(mix), list(mix.values())
+    payform = FakePayform(BENCH_PAYFORM_SECRET)
+    clients = [
+        httpx.AsyncClient(base_url=base_url, transport=transport, follow_redirects=False, timeout=60)
+        for _ in range(args.users)
+    ]
+    vusers = [VirtualUser(c, 500000 + i, podcast_ids, payform) for i, c in enumerate(clients)]
+    for vu in vusers:
+        await vu.run("auth")  # прогрев: сессии до начала замера
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    deadline = time.perf_counter() + args.duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            vu = random.choice(vusers)
+            route = random.choices(routes, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                ok = await vu.run(route)
+            except Exception:
+                ok = False
+            if ok:
+                latencies[route].append(time.perf_counter() - t0)
+            else:
+                errors[route] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    for c in clients:
+        await c.aclose()
+    return latencies, errors, elapsed, payform
+
+
+def report(latencies: dict, errors: dict, elapsed: float) -> None:
+    print(f"{'route':10s} {'req':>7s} {'err':>5s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    total = []
+    for route in ROUTES:
+        values = latencies.get(route, [])
+        if not values and not errors.get(route):
+            continue
+        total += values
+        print(
+            f"{route:10s} {len(values):7d} {errors.get(route, 0):5d} {len(values) / elapsed:8.1f} "
+            f"{statistics.median(values) * 1000 if values else 0:8.1f} "
+            f"{percentile(values, 95) * 1000:8.1f} {percentile(values, 99) * 1000:8.1f}"
+        )
+    print(
+        f"{'total':10s} {len(total):7d} {sum(errors.values()):5d} {len(total) / elapsed:8.1f} "
+        f"{statistics.median(total) * 1000 if total else 0:8.1f} "
+        f"{percentile(total, 95) * 1000:8.1f} {percentile(total, 99) * 1000:8.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--users", type=int, default=50, help="виртуальных пользователей (отдельные сессии)")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных запросов")
+    parser.add_argument("--duration", type=float, default=15.0, help="длительность замера, сек")
+    parser.add_argument("--podcasts", type=int, default=100, help="опубликованных подкастов во временной БД")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"веса маршрутов (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора сценария")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # Настройки читаются при импорте app.*, поэтому окружение готовим заранее
+    os.chdir(PROJECT_ROOT)
+    tmp_dir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/app.db"
+    os.environ["BOT_TOKEN"] = BENCH_BOT_TOKEN
+    os.environ["PAYFORM_SECRET"] = BENCH_PAYFORM_SECRET
+    os.environ["PAYFORM_URL"] = FAKE_PAYFORM_URL
+    os.environ.setdefault("MEDIA_WORKERS", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import httpx
+    from app.main import app
+
+    if args.mode == "uvicorn":
+        import uvicorn
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        try:
+            latencies, errors, elapsed, payform = asyncio.run(drive(args, f"http://127.0.0.1:{port}", None))
+        finally:
+            server.should_exit = True
+    else:
+        async def inprocess():
+            # ASGITransport не шлёт lifespan — запускаем startup/shutdown приложения сами
+            async with app.router.lifespan_context(app):
+                return await drive(args, "http://testserver", httpx.ASGITransport(app=app))
+
+        latencies, errors, elapsed, payform = asyncio.run(inprocess())
+
+    print(f"mode={args.mode} users={args.users} concurrency={args.concurrency} duration={elapsed:.1f}s")
+    report(latencies, errors, elapsed)
+    print(f"payform: orders paid={len(payform.paid)} awaiting={len(payform.pending)} bad links={payform.bad_links}")
+
+
+if __name__ == "__main__":
+    main()
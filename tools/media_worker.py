@@ -0,0 +1,38 @@
+"""
+Отдельный процесс обработки загрузок (если в веб-процессе MEDIA_WORKERS=0).
+
+    python -m tools.media_worker
+
+Забирает задачи из media_jobs и раздаёт их пулу процессов из app/media_jobs.py.
+"""
+import sys
+import os
+import time
+
+# Ensure project root is on sys.path when running as a script
+CURRENT_DIR = os.path.dirname(__file__)
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.config import settings
+from app.database import Base, engine
+from app import media_jobs
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    # воркер запускается отдельно именно для обработки: хотя бы один процесс в пуле
+    settings.media_workers = max(1, settings.media_workers)
+    try:
+        while True:
+            if not media_jobs.dispatch():
+                time.sleep(settings.media_jobs_poll_seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        media_jobs.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,20 @@
-from datetime import datetime, timedelta
+"""
+Демо-данные и генерация объёма «как в проде».
+
+    python -m tools.seed                                   # 6 карточек и 6 подкастов
+    python -m tools.seed --users 1000000 --podcasts 500 --txns-per-user 3 \\
+        --status-mix "success=0.7,pending=0.2,error=0.1" --seed 42
+
+Объёмные данные пишутся через Core insert() (executemany) пачками по --chunk строк,
+каждая пачка — своя транзакция. Один и тот же --seed на пустой БД даёт те же строки,
+поэтому замеры между прогонами сравнимы.
+"""
+import argparse
+import random
 import sys
 import os
+import time
+from datetime import datetime, timedelta
 
 # Ensure project root is on sys.path when running as a script
 CURRENT_DIR = os.path.dirname(__file__)
@@ -8,49 +22,200 @@ PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, os.pardir))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from sqlalchemy import func, insert, select
+
 from app.database import Base, engine, SessionLocal
-from app import models
+from app import models, stats
+
+CATEGORIES = ["финансы", "отношения", "психология"]
+
+
+def seed_demo(db) -> None:
+    # Seed project cards if empty
+    if db.query(models.ProjectCard).count() == 0:
+        cards = [
+            models.ProjectCard(title="Магазин подкастов", url="/podcasts", order=1, is_internal=True),
+            models.ProjectCard(title="Закрытый канал", url="https://t.me/", order=2),
+            models.ProjectCard(title="Курс по финансам", url="https://example.com/finance", order=3),
+            models.ProjectCard(title="Пересказы книг", url="https://example.com/books", order=4),
+            models.ProjectCard(title="Пост и молитва", url="https://example.com/pray", order=5),
+            models.ProjectCard(title="Благотворительность", url="https://example.com/donate", order=6),
+        ]
+        db.add_all(cards)
+
+    # Seed podcasts if empty
+    if db.query(models.Podcast).count() == 0:
+        now = datetime.utcnow()
+        items = []
+        for i in range(1, 6 + 1):
+            items.append(
+                models.Podcast(
+                    title=f"Подкаст #{i}",
+                    description="Описание подкаста. Это демо-данные.",
+                    category=CATEGORIES[i % 3],
+                    published_at=now - timedelta(days=i * 7),
+                    duration_seconds=1800 + i * 120,
+                    cover_path=None,
+                    audio_preview_path=None,
+                    audio_full_path=None,
+                    is_published=True,
+                    is_free=(i == 1),
+                )
+            )
+        db.add_all(items)
+
+    db.commit()
+
+
+def parse_status_mix(raw: str) -> tuple[list[str], list[float]]:
+    statuses, weights = [], []
+    for part in filter(None, (p.strip() for p in raw.split(","))):
+        name, _, weight = part.partition("=")
+        statuses.append(name.strip())
+        weights.append(float(weight or 1))
+    if not statuses or sum(weights) <= 0:
+        raise SystemExit("--status-mix: нужен хотя бы один статус с положительным весом")
+    return statuses, weights
+
+
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _insert_chunked(table, rows, chunk: int) -> int:
+    """Вставить строки из генератора пачками, каждая пачка — отдельная транзакция."""
+    total, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            with engine.begin() as conn:
+                conn.execute(insert(table), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(insert(table), batch)
+        total += len(batch)
+    return total
+
+
+def seed_podcasts(rng: random.Random, count: int, chunk: int, now: datetime) -> list[int]:
+    with engine.connect() as conn:
+        first = _next_id(conn, models.Podcast)
+    ids = list(range(first, first + count))
+
+    def podcasts():
+        for pid in ids:
+            yield {
+                "id": pid,
+                "title": f"Подкаст {pid}",
+                "description": "Сгенерированное описание подкаста. " * rng.randint(1, 8),
+                "category": rng.choice(CATEGORIES),
+                "published_at": now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+                "duration_seconds": rng.randint(600, 7200),
+                "is_published": rng.random() < 0.9,
+                "is_free": rng.random() < 0.05,
+            }
+
+    def prices():
+        for pid in ids:
+            yield {"podcast_id": pid, "price_cents": rng.randrange(9900, 99900, 100)}
+
+    _insert_chunked(models.Podcast.__table__, podcasts(), chunk)
+    _insert_chunked(models.PodcastPrice.__table__, prices(), chunk)
+    return ids
+
+
+def seed_users(args, rng: random.Random, podcast_ids: list[int], now: datetime) -> tuple[int, int]:
+    """Пользователи и их транзакции; has_subscription согласован с успешными подписками."""
+    statuses, weights = parse_status_mix(args.status_mix)
+    max_txns = max(0, round(2 * args.txns_per_user))  # равномерно 0..2×среднее
+    span = args.days * 24 * 3600
+    # random() вместо randint()/choice(): на миллионах строк генерация дороже самой вставки
+    rand, n_podcasts = rng.random, len(podcast_ids)
+    with engine.connect() as conn:
+        first_user = _next_id(conn, models.User)
+        first_txn = _next_id(conn, models.Transaction)
+
+    users_total = txns_total = 0
+    txn_id = first_txn
+    for start in range(0, args.users, args.chunk):
+        users, txns = [], []
+        for user_id in range(first_user + start, first_user + min(args.users, start + args.chunk)):
+            age = int(rand() * span)
+            joined = now - timedelta(seconds=age)
+            subscribed = False
+            pending_items = set()
+            count = int(rand() * (max_txns + 1))
+            for status in rng.choices(statuses, weights, k=count) if count else ():
+                is_sub = not n_podcasts or rand() < args.subscription_share
+                subscribed = subscribed or (is_sub and status == "success")
+                podcast_id = None if is_sub else podcast_ids[int(rand() * n_podcasts)]
+                if status == "pending":
+                    # одна pending на товар (uq_transactions_pending_item), повтор — брошенный заказ
+                    if podcast_id in pending_items:
+                        status = "expired"
+                    pending_items.add(podcast_id)
+                txns.append(
+                    {
+                        "id": txn_id,
+                        "user_id": user_id,
+                        "type": "subscription" if is_sub else "single",
+                        "podcast_id": podcast_id,
+                        "status": status,
+                        "created_at": joined + timedelta(seconds=int(rand() * age)),
+                    }
+                )
+                txn_id += 1
+            users.append(
+                {
+                    "id": user_id,
+                    "telegram_id": f"seed-{args.seed}-{user_id}",
+                    "created_at": joined,
+                    "has_subscription": subscribed,
+                }
+            )
+        with engine.begin() as conn:
+            conn.execute(insert(models.User), users)
+            for i in range(0, len(txns), args.chunk):
+                conn.execute(insert(models.Transaction), txns[i : i + args.chunk])
+        users_total += len(users)
+        txns_total += len(txns)
+        print(f"  users {users_total}/{args.users}, transactions {txns_total}", flush=True)
+    return users_total, txns_total
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=0, help="сгенерировать пользователей")
+    parser.add_argument("--podcasts", type=int, default=0, help="сгенерировать подкастов (с ценами)")
+    parser.add_argument("--txns-per-user", type=float, default=2.0, help="транзакций на пользователя в среднем")
+    parser.add_argument("--status-mix", default="success=0.7,pending=0.2,error=0.1", help="доли статусов транзакций")
+    parser.add_argument("--subscription-share", type=float, default=0.3, help="доля подписок среди транзакций")
+    parser.add_argument("--days", type=int, default=365, help="разброс дат регистрации и оплат, дней назад")
+    parser.add_argument("--chunk", type=int, default=50000, help="строк в одной транзакции")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора (детерминированный результат)")
+    args = parser.parse_args()
+
     Base.metadata.create_all(bind=engine)
     db = SessionLocal()
 
     try:
-        # Seed project cards if empty
-        if db.query(models.ProjectCard).count() == 0:
-            cards = [
-                models.ProjectCard(title="Магазин подкастов", url="/podcasts", order=1, is_internal=True),
-                models.ProjectCard(title="Закрытый канал", url="https://t.me/", order=2),
-                models.ProjectCard(title="Курс по финансам", url="https://example.com/finance", order=3),
-                models.ProjectCard(title="Пересказы книг", url="https://example.com/books", order=4),
-                models.ProjectCard(title="Пост и молитва", url="https://example.com/pray", order=5),
-                models.ProjectCard(title="Благотворительность", url="https://example.com/donate", order=6),
-            ]
-            db.add_all(cards)
-
-        # Seed podcasts if empty
-        if db.query(models.Podcast).count() == 0:
-            now = datetime.utcnow()
-            items = []
-            for i in range(1, 6 + 1):
-                items.append(
-                    models.Podcast(
-                        title=f"Подкаст #{i}",
-                        description="Описание подкаста. Это демо-данные.",
-                        category=["финансы", "отношения", "психология"][i % 3],
-                        published_at=now - timedelta(days=i * 7),
-                        duration_seconds=1800 + i * 120,
-                        cover_path=None,
-                        audio_preview_path=None,
-                        audio_full_path=None,
-                        is_published=True,
-                        is_free=(i == 1),
-                    )
-                )
-            db.add_all(items)
-
-        db.commit()
+        seed_demo(db)
+        if args.users or args.podcasts:
+            rng = random.Random(args.seed)
+            now = datetime(2025, 1, 1) + timedelta(days=args.days)  # фиксированная «сегодня» для повторяемости
+            started = time.perf_counter()
+            podcast_ids = seed_podcasts(rng, args.podcasts, args.chunk, now) if args.podcasts else []
+            if not podcast_ids:
+                podcast_ids = db.execute(select(models.Podcast.id)).scalars().all()
+            users, txns = seed_users(args, rng, podcast_ids, now) if args.users else (0, 0)
+            elapsed = time.perf_counter() - started
+            rows = len(podcast_ids if args.podcasts else []) + users + txns
+            print(f"Bulk load: {args.podcasts} podcasts, {users} users, {txns} transactions in {elapsed:.1f}s "
+                  f"({rows / elapsed:.0f} rows/s)")
+            # счётчики дашборда — по факту; права доступа: python -m tools.backfill_entitlements
+            stats.reconcile(db)
         print("Seeding completed.")
     finally:
         db.close()
@@ -58,5 +223,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
-